@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse, StreamingResponse
 from firebase_admin import auth as fb_auth
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore as firestore_module
 from app import db as db_module
 from app import membership as mb
 from app import scores
-from app.auth import current_user
+from app import market_data
+from app import trade_tape
+from app.auth import current_user, invalidate_user, username_ref, valid_username
 from app.models import User, Trade, CustomGame, MarketNews
+from app.order_book import OrderBook, clear_all_orders
+from app.state import books
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from pydantic import BaseModel
@@ -13,15 +19,24 @@ import asyncio
 import datetime as dt
 import io
 import logging
+import os
+import re
+import time
 import uuid
-from decimal import Decimal
-from typing import Dict, Optional
+from collections import Counter
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Any, Dict, Optional
 
 log = logging.getLogger("uvicorn.error")
 
 router = APIRouter()
 BASE_DIR = Path(__file__).parent
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+# Compiled templates are cached in memory either way; auto_reload only adds an
+# mtime check per render. Templates change on deploy, so it is off unless
+# TEMPLATE_AUTO_RELOAD=1 (handy while editing admin.html locally).
+templates.env.auto_reload = os.getenv("TEMPLATE_AUTO_RELOAD") == "1"
 
 
 GAME_COLLECTIONS = {
@@ -55,108 +70,166 @@ def require_admin(user: User = Depends(current_user)):
     return user
 
 
-def _pnl_apply_buy(pos: dict, price: Decimal, qty: Decimal) -> None:
-    """Apply a buy fill to a {qty, total_cost, realized_pnl} position dict."""
-    if pos["qty"] >= 0:
+@dataclass(slots=True)
+class _Position:
+    qty: float = 0.0
+    total_cost: float = 0.0
+    realized_pnl: float = 0.0
+
+
+def _pnl_apply_buy(pos: _Position, price: float, qty: float) -> None:
+    """Apply a buy fill to a position."""
+    if pos.qty >= 0:
         # Opening/adding to long
-        pos["total_cost"] += price * qty
-        pos["qty"] += qty
+        pos.total_cost += price * qty
+        pos.qty += qty
     else:
         # Covering short
-        close_qty = min(qty, abs(pos["qty"]))
-        avg_short = abs(pos["total_cost"] / pos["qty"])
-        pos["realized_pnl"] += (avg_short - price) * close_qty
+        close_qty = min(qty, abs(pos.qty))
+        avg_short = abs(pos.total_cost / pos.qty)
+        pos.realized_pnl += (avg_short - price) * close_qty
 
-        pos["qty"] += qty
+        pos.qty += qty
         remaining = qty - close_qty
 
-        if pos["qty"] > 0:
-            pos["total_cost"] = price * remaining
-        elif pos["qty"] == 0:
-            pos["total_cost"] = Decimal("0")
+        if pos.qty > 0:
+            pos.total_cost = price * remaining
+        elif pos.qty == 0:
+            pos.total_cost = 0.0
         else:
             # Partial cover: remove the covered portion from cost basis
-            pos["total_cost"] -= avg_short * close_qty
+            pos.total_cost -= avg_short * close_qty
 
 
-def _pnl_apply_sell(pos: dict, price: Decimal, qty: Decimal) -> None:
-    """Apply a sell fill to a {qty, total_cost, realized_pnl} position dict."""
-    if pos["qty"] <= 0:
+def _pnl_apply_sell(pos: _Position, price: float, qty: float) -> None:
+    """Apply a sell fill to a position."""
+    if pos.qty <= 0:
         # Opening/adding to short
-        pos["total_cost"] += price * qty
-        pos["qty"] -= qty
+        pos.total_cost += price * qty
+        pos.qty -= qty
     else:
         # Closing long
-        close_qty = min(qty, pos["qty"])
-        avg_long = pos["total_cost"] / pos["qty"]
-        pos["realized_pnl"] += (price - avg_long) * close_qty
+        close_qty = min(qty, pos.qty)
+        avg_long = pos.total_cost / pos.qty
+        pos.realized_pnl += (price - avg_long) * close_qty
 
-        pos["qty"] -= qty
+        pos.qty -= qty
         remaining = qty - close_qty
 
-        if pos["qty"] < 0:
-            pos["total_cost"] = price * remaining
-        elif pos["qty"] == 0:
-            pos["total_cost"] = Decimal("0")
+        if pos.qty < 0:
+            pos.total_cost = price * remaining
+        elif pos.qty == 0:
+            pos.total_cost = 0.0
         else:
             # Partial close: remove the sold portion from cost basis
-            pos["total_cost"] -= avg_long * close_qty
+            pos.total_cost -= avg_long * close_qty
+
+
+# Firestore caps a write batch at 500 operations; bulk writes are split into
+# batches of that size and committed a few at a time.
+BATCH_LIMIT = 500
+BATCH_CONCURRENCY = 20
+
+
+async def _commit_chunked(items, write) -> None:
+    """Apply ``write(batch, item)`` to every item, committing full batches concurrently."""
+    items = list(items)
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def commit(chunk):
+        batch = db_module.db.batch()
+        for item in chunk:
+            write(batch, item)
+        async with sem:
+            await batch.commit()
+
+    await asyncio.gather(*(commit(items[i:i + BATCH_LIMIT]) for i in range(0, len(items), BATCH_LIMIT)))
 
 
-async def calculate_all_user_stats() -> tuple[Dict[str, float], Dict[str, int]]:
+async def bulk_delete(refs) -> None:
+    await _commit_chunked(refs, lambda batch, ref: batch.delete(ref))
+
+
+async def delete_all_in_collection(coll_name: str) -> None:
     """
-    Single pass over all trades (in chronological order) to compute every
-    user's P&L and trade count at once, instead of re-querying per user.
-    Custom games are marked to their expected value; stocks to the live ref price.
+    Firestore has no "drop collection". Stream the documents and delete them
+    a batch at a time, so at most BATCH_CONCURRENCY batches of references are
+    held in memory rather than the whole collection.
     """
-    from app.market_data import get_ref_price
-
-    # Expected values for custom games
-    g_docs = await db_module.db.collection("custom_games").get()
-    game_expected_values = {}
-    for d in g_docs:
-        data = d.to_dict()
-        sym = data.get("symbol")
-        if sym:
-            game_expected_values[sym] = float(data.get("expected_value") or 0.0)
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+    pending = []
 
-    t_docs = await db_module.db.collection("trades").get()
-    trades = [Trade(id=d.id, **d.to_dict()) for d in t_docs]
+    async def commit(chunk):
+        try:
+            batch = db_module.db.batch()
+            for ref in chunk:
+                batch.delete(ref)
+            await batch.commit()
+        finally:
+            sem.release()
+
+    async def flush(chunk):
+        await sem.acquire()
+        pending.append(asyncio.create_task(commit(chunk)))
+
+    chunk = []
+    async for doc in db_module.db.collection(coll_name).select([]).stream():
+        chunk.append(doc.reference)
+        if len(chunk) >= BATCH_LIMIT:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    await asyncio.gather(*pending)
+
+
+def compute_user_stats(
+        trades: list[Trade],
+        game_expected_values: Dict[str, float],
+) -> tuple[Dict[str, float], Counter]:
+    """
+    Fold every trade into per-user positions in one pass and return each
+    user's P&L and trade count. Custom games are marked to their expected
+    value; stocks to the live ref price.
+    """
     # Cost-basis accounting is order-dependent; make it deterministic
-    trades.sort(key=lambda t: t.created_at or dt.datetime.min.replace(tzinfo=dt.timezone.utc))
+    trades = sorted(trades, key=lambda t: t.created_at or dt.datetime.min.replace(tzinfo=dt.timezone.utc))
 
-    positions: Dict[str, Dict[str, dict]] = {}   # user_id -> symbol -> position
-    trade_counts: Dict[str, int] = {}
+    positions: Dict[str, Dict[str, _Position]] = {}   # user_id -> symbol -> position
+    trade_counts: Counter = Counter()
 
-    def _pos(uid: str, sym: str) -> dict:
-        return positions.setdefault(uid, {}).setdefault(sym, {
-            "qty": Decimal("0"),
-            "total_cost": Decimal("0"),
-            "realized_pnl": Decimal("0"),
-        })
+    def _pos(uid: str, sym: str) -> _Position:
+        syms = positions.setdefault(uid, {})
+        pos = syms.get(sym)
+        if pos is None:
+            pos = syms[sym] = _Position()
+        return pos
 
+    # Plain floats: prices and expected values are floats to begin with, and
+    # Decimal arithmetic made this loop the slowest part of the dashboard.
     for trade in trades:
-        price = Decimal(trade.price)
-        qty = Decimal(trade.qty)
+        price = float(trade.price)
+        qty = float(trade.qty)
         _pnl_apply_buy(_pos(trade.buyer_id, trade.symbol), price, qty)
         _pnl_apply_sell(_pos(trade.seller_id, trade.symbol), price, qty)
-        trade_counts[trade.buyer_id] = trade_counts.get(trade.buyer_id, 0) + 1
-        trade_counts[trade.seller_id] = trade_counts.get(trade.seller_id, 0) + 1
+        trade_counts[trade.buyer_id] += 1
+        trade_counts[trade.seller_id] += 1
+
+    # Mark prices: game values first, then one market lookup per other symbol
+    ref_prices = dict(game_expected_values)
+    for syms in positions.values():
+        for symbol in syms.keys() - ref_prices.keys():
+            ref_prices[symbol] = market_data.get_ref_price(symbol) or 0.0
 
     pnls: Dict[str, float] = {}
     for uid, syms in positions.items():
-        total_pnl = Decimal("0")
+        total_pnl = 0.0
         for symbol, pos in syms.items():
-            qty = pos["qty"]
-            total_cost = pos["total_cost"]
-
-            if symbol in game_expected_values:
-                ref_price = Decimal(str(game_expected_values[symbol]))
-            else:
-                market_ref = get_ref_price(symbol)
-                ref_price = Decimal(str(market_ref)) if market_ref else Decimal("0")
+            qty = pos.qty
+            total_cost = pos.total_cost
 
-            unrealized = Decimal("0")
+            ref_price = ref_prices[symbol]
+            unrealized = 0.0
             if qty != 0 and ref_price > 0:
                 avg_cost = total_cost / abs(qty)
                 if qty > 0:
@@ -164,34 +237,105 @@ async def calculate_all_user_stats() -> tuple[Dict[str, float], Dict[str, int]]:
                 else:
                     unrealized = (avg_cost - ref_price) * abs(qty)
 
-            total_pnl += pos["realized_pnl"] + unrealized
-        pnls[uid] = float(total_pnl)
+            total_pnl += pos.realized_pnl + unrealized
+        pnls[uid] = round(total_pnl, 2)
 
     return pnls, trade_counts
 
 
+# symbol -> expected value for custom games. They change only through the
+# admin endpoints below, which invalidate this, so a short TTL is plenty.
+GAMES_CACHE_TTL = 30.0
+_games_cache: Dict[str, Any] = {"at": 0.0, "data": None, "gen": 0}
+
+
+async def get_game_expected_values() -> Dict[str, float]:
+    now = time.monotonic()
+    if _games_cache["data"] is not None and now - _games_cache["at"] < GAMES_CACHE_TTL:
+        return _games_cache["data"]
+
+    # An admin write may land while the fetch is in flight; the generation
+    # check stops the pre-write snapshot from being cached as fresh.
+    gen = _games_cache["gen"]
+    g_docs = await db_module.db.collection("custom_games").select(["symbol", "expected_value"]).get()
+    data: Dict[str, float] = {}
+    for d in g_docs:
+        g = d.to_dict()
+        sym = g.get("symbol")
+        if sym:
+            data[sym] = float(g.get("expected_value") or 0.0)
+    if _games_cache["gen"] == gen:
+        _games_cache["at"] = now
+        _games_cache["data"] = data
+    return data
+
+
+def invalidate_games_cache() -> None:
+    _games_cache["at"] = 0.0
+    _games_cache["data"] = None
+    _games_cache["gen"] += 1
+    invalidate_stats_cache()
+
+
+# Everything compute_user_stats reads from a trade
+TRADE_PNL_FIELDS = ["symbol", "buyer_id", "seller_id", "price", "qty", "created_at"]
+
+
+# Back-to-back dashboard loads reuse the last fold. Trade writes and game
+# value changes invalidate it; the TTL bounds drift in live stock prices.
+STATS_CACHE_TTL = 10.0
+_stats_cache: Dict[str, Any] = {"at": 0.0, "data": None, "gen": 0}
+
+
+async def calculate_all_user_stats() -> tuple[Dict[str, float], Counter]:
+    """
+    Fetch all trades and custom games once and compute every user's P&L and
+    trade count from them, instead of re-querying per user.
+    """
+    now = time.monotonic()
+    if _stats_cache["data"] is not None and now - _stats_cache["at"] < STATS_CACHE_TTL:
+        return _stats_cache["data"]
+
+    gen = _stats_cache["gen"]
+    game_expected_values, t_docs = await asyncio.gather(
+        get_game_expected_values(),
+        db_module.db.collection("trades").select(TRADE_PNL_FIELDS).get(),
+    )
+    # The projection leaves out the order IDs, which P&L never reads
+    trades = [Trade(id=d.id, buy_order_id="", sell_order_id="", **d.to_dict()) for d in t_docs]
+    data = compute_user_stats(trades, game_expected_values)
+    if _stats_cache["gen"] == gen:
+        _stats_cache["at"] = now
+        _stats_cache["data"] = data
+    return data
+
+
+def invalidate_stats_cache() -> None:
+    _stats_cache["at"] = 0.0
+    _stats_cache["data"] = None
+    _stats_cache["gen"] += 1
+
+
 @router.get("/admin", response_class=HTMLResponse)
 async def admin_dashboard(
         request: Request,
         user: User = Depends(require_admin)
 ):
     """Admin dashboard page"""
-    # Get all users
-    users_ref = db_module.db.collection("users")
-    u_docs = await users_ref.get()
+    builtin_types = ("fiveos", "headline", "poker_auction", "mental_math")
+
+    # The reads below are independent, so issue them together: the page then
+    # waits for the slowest round-trip rather than the sum of all of them.
+    u_docs, (pnls, trade_counts), custom_docs, *builtin_docs = await asyncio.gather(
+        db_module.db.collection("users").get(),
+        # One pass over all trades: P&L + trade counts for every user
+        calculate_all_user_stats(),
+        # Custom games (filter on is_active)
+        db_module.db.collection("custom_games").where("is_active", "==", True).get(),
+        *(db_module.db.collection(GAME_COLLECTIONS[gtype]).get() for gtype in builtin_types),
+    )
     users = [User(id=d.id, **d.to_dict()) for d in u_docs]
 
-    # One pass over all trades: P&L + trade counts for every user
-    pnls, trade_counts = await calculate_all_user_stats()
-
-    # One projected query for order counts (only user_id is transferred)
-    o_docs = await db_module.db.collection("orders").select(["user_id"]).get()
-    order_counts: Dict[str, int] = {}
-    for d in o_docs:
-        ouid = d.get("user_id")
-        if ouid:
-            order_counts[ouid] = order_counts.get(ouid, 0) + 1
-
     total_trades = sum(trade_counts.values()) // 2  # each trade has a buyer and a seller
 
     user_stats = []
@@ -202,7 +346,7 @@ async def admin_dashboard(
             "username": u.username,
             "balance": u.balance,
             "pnl": pnls.get(uid, 0.0),
-            "orders": order_counts.get(uid, 0),
+            "orders": u.orders_count,
             "trades": trade_counts.get(uid, 0),
             "is_admin": u.is_admin,
             "is_blacklisted": u.is_blacklisted,
@@ -211,14 +355,12 @@ async def admin_dashboard(
         })
 
     # Sort by P&L for leaderboard
-    leaderboard = sorted(user_stats, key=lambda x: x["pnl"], reverse=True)
+    leaderboard = sorted(user_stats, key=itemgetter("pnl"), reverse=True)
 
     # Get all games across custom + built-in collections
     games = []
 
-    # Custom games (filter on is_active)
-    custom_q = db_module.db.collection("custom_games").where("is_active", "==", True)
-    for d in await custom_q.get():
+    for d in custom_docs:
         data = d.to_dict()
         games.append({
             "id": d.id,
@@ -234,9 +376,8 @@ async def admin_dashboard(
         })
 
     # Built-in games — filter out finished docs
-    for gtype in ("fiveos", "headline", "poker_auction", "mental_math"):
-        coll = db_module.db.collection(GAME_COLLECTIONS[gtype])
-        for d in await coll.get():
+    for gtype, docs in zip(builtin_types, builtin_docs):
+        for d in docs:
             data = d.to_dict()
             if data.get("status") == "finished":
                 continue
@@ -283,6 +424,11 @@ async def admin_dashboard(
 
 
 # Custom Game Management
+
+# The symbol also becomes the document id (game_<symbol>), so no slashes
+_SYMBOL_RE = re.compile(r"GAME[A-Z0-9_]+")
+
+
 class GameCreate(BaseModel):
     symbol: str
     name: str
@@ -307,22 +453,16 @@ async def create_game(
     """Create a new custom game"""
     # Validate symbol format
     symbol = game.symbol.upper().strip()
-    if not symbol.startswith("GAME"):
-        raise HTTPException(status_code=400, detail="Symbol must start with 'GAME'")
-
-    # Check if symbol already exists
-    games_ref = db_module.db.collection("custom_games")
-    q = games_ref.where("symbol", "==", symbol).limit(1)
-    docs = await q.get()
-    
-    if docs:
-        raise HTTPException(status_code=400, detail=f"Game with symbol {symbol} already exists")
+    if not _SYMBOL_RE.fullmatch(symbol):
+        raise HTTPException(status_code=400,
+                            detail="Symbol must be 'GAME' followed by letters, digits or underscores")
 
     game_id = f"game_{symbol.lower()}"
     # Validate game_type
     valid_types = ("market", "5os", "other")
     gtype = game.game_type if game.game_type in valid_types else "other"
 
+    now = dt.datetime.utcnow()
     new_game = CustomGame(
         id=game_id,
         symbol=symbol,
@@ -332,15 +472,19 @@ async def create_game(
         game_type=gtype,
         is_active=True,
         created_by=str(admin.id),
-        created_at=dt.datetime.utcnow(),
-        updated_at=dt.datetime.utcnow()
+        created_at=now,
+        updated_at=now
     )
 
-    await db_module.db.collection("custom_games").document(game_id).set(new_game.model_dump(exclude={"id"}))
+    # The id is derived from the symbol, so create() doubles as the
+    # uniqueness check and two racing requests can't both succeed
+    try:
+        await db_module.db.collection("custom_games").document(game_id).create(new_game.model_dump(exclude={"id"}))
+    except AlreadyExists:
+        raise HTTPException(status_code=400, detail=f"Game with symbol {symbol} already exists")
+    invalidate_games_cache()
 
     # Add to order books
-    from app.state import books
-    from app.order_book import OrderBook
     books[symbol] = OrderBook()
 
     return {"ok": True, "game": {
@@ -370,10 +514,11 @@ async def update_game(
         "name": game.name,
         "instructions": game.instructions,
         "expected_value": game.expected_value,
-        "updated_at": dt.datetime.utcnow()
+        "updated_at": firestore_module.SERVER_TIMESTAMP
     }
 
     await doc_ref.update(update_data)
+    invalidate_games_cache()
 
     return {"ok": True, "message": "Game updated"}
 
@@ -391,7 +536,7 @@ async def delete_game(
 
     await doc_ref.update({
         "is_active": False,
-        "updated_at": dt.datetime.utcnow()
+        "updated_at": firestore_module.SERVER_TIMESTAMP
     })
 
     return {"ok": True, "message": "Game deactivated"}
@@ -484,8 +629,9 @@ async def resolve_game(
     
     await doc_ref.update({
         "expected_value": resolve_data.expected_value,
-        "updated_at": dt.datetime.utcnow()
+        "updated_at": firestore_module.SERVER_TIMESTAMP
     })
+    invalidate_games_cache()
 
     return {
         "ok": True,
@@ -540,7 +686,7 @@ async def delete_game_typed(game_type: str, game_id: str, admin: User = Depends(
     if game_type == "custom":
         await doc_ref.update({
             "is_active": False,
-            "updated_at": dt.datetime.utcnow(),
+            "updated_at": firestore_module.SERVER_TIMESTAMP,
         })
     else:
         # Built-in games use status lifecycle
@@ -565,6 +711,7 @@ async def blacklist_user(
          raise HTTPException(status_code=400, detail="Cannot blacklist admin users")
 
     await doc_ref.update({"is_blacklisted": True})
+    invalidate_user(user_id)
 
     return {"ok": True, "message": f"User {u_data.get('username')} blacklisted"}
 
@@ -582,6 +729,7 @@ async def unblacklist_user(
         raise HTTPException(status_code=404, detail="User not found")
 
     await doc_ref.update({"is_blacklisted": False})
+    invalidate_user(user_id)
     
     u_data = doc.to_dict()
     return {"ok": True, "message": f"User {u_data.get('username')} unblacklisted"}
@@ -603,24 +751,19 @@ async def delete_user(
     if u_data.get("is_admin"):
         raise HTTPException(status_code=400, detail="Cannot delete admin users")
 
-    # Delete user's orders
+    # Find the user's orders and trades (one query per trade side), all at once
     orders_ref = db_module.db.collection("orders")
-    o_docs = await orders_ref.where("user_id", "==", user_id).get()
-    for d in o_docs:
-        await d.reference.delete()
-
-    # Delete user's trades (simpler to query separately for buyer/seller or just iterate if not too many)
-    # A cleaner way is complex OR query or two queries.
     trades_ref = db_module.db.collection("trades")
-    t_docs_1 = await trades_ref.where("buyer_id", "==", user_id).get()
-    t_docs_2 = await trades_ref.where("seller_id", "==", user_id).get()
-    
-    # Use a set of IDs to avoid double delete if user bought from themselves (unlikely but possible logic)
-    t_ids = set()
-    for d in t_docs_1 + t_docs_2:
-        if d.id not in t_ids:
-            await d.reference.delete()
-            t_ids.add(d.id)
+    # Only references are needed, so fetch no fields
+    o_docs, t_docs_1, t_docs_2 = await asyncio.gather(
+        orders_ref.where("user_id", "==", user_id).select([]).get(),
+        trades_ref.where("buyer_id", "==", user_id).select([]).get(),
+        trades_ref.where("seller_id", "==", user_id).select([]).get(),
+    )
+
+    # Key trades by ID to avoid a double delete if the user traded with themselves
+    t_docs = {d.id: d for d in t_docs_1 + t_docs_2}
+    await bulk_delete([d.reference for d in o_docs] + [d.reference for d in t_docs.values()])
 
     # Ratings and XP live outside the user document, so deleting only the user
     # left them on the leaderboards as a ghost.
@@ -634,8 +777,16 @@ async def delete_user(
         except Exception as exc:
             log.warning("delete_user: could not remove %s/%s: %s", coll, doc_id, exc)
 
+    # Free the username, unless the claim belongs to another account
+    username = u_data.get("username")
+    if username and valid_username(username):
+        claim = await username_ref(username).get()
+        if claim.exists and (claim.to_dict() or {}).get("uid") == user_id:
+            await claim.reference.delete()
+
     # Delete user
     await doc_ref.delete()
+    invalidate_user(user_id)
 
     # The account also exists in Firebase Auth, and that is what owns the email
     # address. Without this the record was gone from Firestore but signing up
@@ -653,6 +804,7 @@ async def delete_user(
         log.error("delete_user: Firebase Auth delete failed for %s: %s", auth_uid, exc)
         auth_note = f"Firebase sign-in record could NOT be removed ({exc})"
 
+    invalidate_stats_cache()
     try:
         scores.invalidate_cache()
     except Exception:
@@ -684,36 +836,26 @@ async def reset_all_users(
     # We'll select all and filter in app, or use != query if index exists
     
     # Simple iteration for safety
-    docs = await users_ref.get()
-    batch = db_module.db.batch()
-    
-    for d in docs:
-        u = d.to_dict()
-        if not u.get("is_admin"):
-             batch.update(d.reference, {"balance": 10000.0})
-    
-    await batch.commit()
-
-    # Delete all trades
-    # To delete all validly we must list and delete chunks
-    async def delete_all_in_collection(coll_name, batch_size=50):
-        coll_ref = db_module.db.collection(coll_name)
-        while True:
-            docs = await coll_ref.limit(batch_size).get()
-            if not docs:
-                break
-            for d in docs:
-                await d.reference.delete()
+    docs = await users_ref.select(["is_admin"]).get()
+    # Everyone's orders are deleted below, admins' included, so every order
+    # count goes back to zero; balances reset for players only.
+    await _commit_chunked(
+        docs,
+        lambda batch, d: batch.update(d.reference, {"orders_count": 0} if d.to_dict().get("is_admin")
+                                      else {"orders_count": 0, "balance": 10000.0}),
+    )
 
+    # Delete all trades and orders
     await delete_all_in_collection("trades")
     await delete_all_in_collection("orders")
 
+    invalidate_stats_cache()
+
     # Clear in-memory order book, cached positions, and the trades tape
-    from app.order_book import clear_all_orders
     clear_all_orders()
+    # Imported here: app.main imports this module to mount the router
     from app import main as main_module
     main_module.positions.clear()
-    from app import trade_tape
     trade_tape.clear_all()
 
     return {"ok": True, "message": "All users reset to initial state"}
@@ -725,7 +867,7 @@ async def admin_create_news(
         admin: User = Depends(require_admin)
 ):
     """Admin add news"""
-    news_id = str(uuid.uuid4())
+    news_id = uuid.uuid4().hex
     item = MarketNews(
         id=news_id,
         content=payload.content,
@@ -876,6 +1018,7 @@ async def approve_role_request(user_id: str, admin: User = Depends(require_admin
                          "decided_at": dt.datetime.utcnow(),
                          "decided_by": str(admin.id)},
     })
+    invalidate_user(user_id)
     return {"ok": True, "role": role}
 
 
@@ -908,6 +1051,7 @@ async def set_user_role(user_id: str, payload: RoleUpdate, admin: User = Depends
         raise HTTPException(404, "User not found")
 
     await doc_ref.update({"role": payload.role})
+    invalidate_user(user_id)
     return {"ok": True, "role": payload.role}
 
 
@@ -962,8 +1106,8 @@ async def generate_cv_book(
     admin: User = Depends(require_admin),
 ):
     """Generate and stream the full CV book PDF."""
+    # reportlab/pypdf are only needed for this one admin action
     from app.cv_book import build_cv_book
-    import asyncio
 
     if not db_module.bucket:
         raise HTTPException(500, "Storage not configured")
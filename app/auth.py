@@ -1,13 +1,14 @@
 from __future__ import annotations
-import os, datetime as dt, logging
-from typing import Optional
+import asyncio, os, logging, time
+from typing import Dict, Optional, Tuple
 
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, status
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+import jwt
 from firebase_admin import auth as fb_auth
+from google.api_core.exceptions import AlreadyExists
 
 # Import Firestore module
 from app import db as db_module
@@ -20,6 +21,20 @@ ALGORITHM = "HS256"
 COOKIE_NAME = "__session"  # Firebase Hosting ONLY forwards cookies named __session
 COOKIE_MAX_AGE = 60 * 60 * 24 * 7  # 7 days
 
+# Decoded session tokens: polling endpoints present the same cookie every few
+# seconds, so skip re-verifying it. An entry never outlives the token's exp.
+TOKEN_CACHE_TTL = 60.0
+TOKEN_CACHE_MAX = 10_000
+_token_cache: Dict[str, Tuple[str, float]] = {}  # token -> (uid, valid until)
+
+# User documents behind a verified token. Kept short: an admin change made on
+# another instance (blacklist, role) applies within USER_CACHE_TTL; on this
+# one invalidate_user() applies it at once.
+USER_CACHE_TTL = 10.0
+USER_CACHE_MAX = 10_000
+_user_cache: Dict[str, Tuple[User, float]] = {}  # uid -> (user, fetched at)
+_user_cache_gen = 0
+
 # Cookie + Bearer support
 http_bearer = HTTPBearer(auto_error=False)
 
@@ -43,27 +58,80 @@ def auth_config():
 
 def create_token(user_id: str, max_age: int = COOKIE_MAX_AGE) -> str:
     # user_id is the Firestore Document ID string
-    exp = dt.datetime.utcnow() + dt.timedelta(seconds=max_age)
+    exp = int(time.time()) + max_age
     return jwt.encode({"sub": user_id, "exp": exp}, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_user_from_token(token: str) -> Optional[User]:
+def _token_uid(token: str) -> Optional[str]:
+    """The token's subject if it verifies, served from _token_cache when possible."""
+    now = time.time()
+    hit = _token_cache.get(token)
+    if hit and hit[1] > now:
+        return hit[0]
     try:
         data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        uid = data.get("sub")
-        if not uid: return None
-    except JWTError as e:
+    except jwt.PyJWTError as e:
         log.warning("JWT decode failed: %s", e)
         return None
-    
+    uid = data.get("sub")
+    if not uid:
+        return None
+    if len(_token_cache) >= TOKEN_CACHE_MAX:
+        _token_cache.clear()
+    until = now + TOKEN_CACHE_TTL
+    _token_cache[token] = (uid, min(until, data.get("exp", until)))
+    return uid
+
+def invalidate_user(uid: str) -> None:
+    """Forget a cached user document; call after writing fields current_user exposes."""
+    global _user_cache_gen
+    _user_cache_gen += 1
+    _user_cache.pop(str(uid), None)
+
+async def get_user_from_token(token: str) -> Optional[User]:
+    uid = _token_uid(token)
+    if not uid:
+        return None
+
+    now = time.monotonic()
+    hit = _user_cache.get(uid)
+    if hit and now - hit[1] < USER_CACHE_TTL:
+        return hit[0].model_copy()
+
     # Firestore get
+    gen = _user_cache_gen
     doc_ref = db_module.db.collection("users").document(uid)
     doc = await doc_ref.get()
 
     if doc.exists:
         u_data = doc.to_dict()
-        return User(id=doc.id, **u_data)
+        user = User(id=doc.id, **u_data)
+        # Don't cache over an invalidation that landed during the read
+        if gen == _user_cache_gen:
+            if len(_user_cache) >= USER_CACHE_MAX:
+                _user_cache.clear()
+            _user_cache[uid] = (user, now)
+        return user.model_copy()
     return None
 
+# Username claims: usernames/{username} -> {"uid": ...}. Makes the uniqueness
+# check a keyed read instead of a query over users; see
+# scripts/backfill_usernames.py for accounts created before it existed.
+USERNAMES_COLLECTION = "usernames"
+
+def username_ref(username: str):
+    return db_module.db.collection(USERNAMES_COLLECTION).document(username)
+
+USERNAME_RULES = "Username can't contain '/', be only dots, look like __name__ or be over 1500 bytes"
+
+def valid_username(username: str) -> bool:
+    """Usernames double as document ids, so they follow Firestore's id rules."""
+    return (
+        "/" not in username
+        and bool(username.strip("."))
+        and not (len(username) >= 4 and username.startswith("__") and username.endswith("__"))
+        and len(username.encode("utf-8")) <= 1500
+    )
+
 def _is_https(request: Request) -> bool:
     """Check if the original client connection is HTTPS (handles proxies)."""
     # Cloud Run/Firebase Hosting sets X-Forwarded-Proto
@@ -122,7 +190,8 @@ async def auth_firebase(request: Request, id_token: str = Form(...), username: s
     Sets a session cookie.
     """
     try:
-        decoded_token = fb_auth.verify_id_token(id_token)
+        # Blocking: verifies the signature and may fetch Google's public keys
+        decoded_token = await asyncio.to_thread(fb_auth.verify_id_token, id_token)
         firebase_uid = decoded_token['uid']
         email = decoded_token.get('email', '')
         
@@ -131,7 +200,14 @@ async def auth_firebase(request: Request, id_token: str = Form(...), username: s
         # Using firebase_uid as Document ID is simpler and cleaner.
         
         doc_ref = db_module.db.collection("users").document(firebase_uid)
-        doc = await doc_ref.get()
+        if username and not valid_username(username):
+            return JSONResponse({"status": "error", "message": USERNAME_RULES}, status_code=400)
+        name_doc = None
+        if username:
+            # Signup form: check the name alongside the user doc, not after it
+            doc, name_doc = await asyncio.gather(doc_ref.get(), username_ref(username).get())
+        else:
+            doc = await doc_ref.get()
         
         user = None
 
@@ -142,18 +218,20 @@ async def auth_firebase(request: Request, id_token: str = Form(...), username: s
             # stored; backfill it from the verified token on next sign-in.
             if email and not data.get("email"):
                 await doc_ref.update({"email": email})
+                invalidate_user(doc.id)
                 user.email = email
         else:
             # First time logic (Signup)
             if not username:
                 # Fallback: use email part or random
                 username = email.split('@')[0] if email else f"user_{firebase_uid[:6]}"
+                if not valid_username(username):
+                    username = f"user_{firebase_uid[:6]}"
             
-            # Check username uniqueness
-            # Firestore query for username
-            q = db_module.db.collection("users").where("username", "==", username).limit(1)
-            existing_docs = await q.get()
-            if existing_docs:
+            # Check username uniqueness (already fetched if the form sent one)
+            if name_doc is None:
+                name_doc = await username_ref(username).get()
+            if name_doc.exists:
                  return JSONResponse({"status": "error", "message": "Username already taken"}, status_code=400)
 
             user = User(
@@ -170,9 +248,17 @@ async def auth_firebase(request: Request, id_token: str = Form(...), username: s
             # to_dict helper?
             user_dict = user.model_dump(exclude={"id"})
             # convert datetime to simple timestamp/server timestamp if needed, but firestore handles datetime ok-ish
+            # Claim the name and write the user in one atomic commit; create()
+            # fails the whole batch if someone took the name since the check
             # Explicitly set document ID to firebase_uid
-            await db_module.db.collection("users").document(firebase_uid).set(user_dict)
-            log.info(f"Created new user: {username} ({firebase_uid})")
+            batch = db_module.db.batch()
+            batch.create(username_ref(username), {"uid": firebase_uid})
+            batch.set(doc_ref, user_dict)
+            try:
+                await batch.commit()
+            except AlreadyExists:
+                return JSONResponse({"status": "error", "message": "Username already taken"}, status_code=400)
+            log.info("Created new user: %s (%s)", username, firebase_uid)
             # User created successfully
         
         # Create session
@@ -221,6 +307,7 @@ async def direct_login(request: Request, username: str = Form(...), password: st
             firebase_uid=ADMIN_UID,
         )
         await doc_ref.set(admin_user.model_dump(exclude={"id"}))
+        await username_ref(admin_user.username).set({"uid": ADMIN_UID})
 
     token = create_token(ADMIN_UID)
     response = JSONResponse({"status": "ok", "redirect": "/"})
@@ -69,14 +69,14 @@ def init_firestore():
              logging.debug("init_firestore: using default AsyncClient constructor")
              db = firestore.AsyncClient()
              
-        logging.info(f"Firestore AsyncClient initialized. Project: {db.project}")
+        logging.info("Firestore AsyncClient initialized. Project: %s", db.project)
 
         # Initialize Storage Bucket
         bucket = storage.bucket()
-        logging.info(f"Storage bucket initialized: {bucket.name}")
+        logging.info("Storage bucket initialized: %s", bucket.name)
 
     except Exception as e:
-        logging.error(f"Failed to initialize Firebase/Firestore: {e}")
+        logging.error("Failed to initialize Firebase/Firestore: %s", e)
         # Re-raise to stop startup if critical
         raise
 
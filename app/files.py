@@ -2,7 +2,9 @@ from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from app.auth import current_user
 from app.models import User
 from app import db as db_module
-import uuid
+import asyncio
+import secrets
+import time
 import datetime as dt
 
 router = APIRouter()
@@ -22,26 +24,29 @@ async def upload_file(
 
     # Generate unique filename
     ext = file.filename.split(".")[-1] if "." in file.filename else "bin"
-    timestamp = int(dt.datetime.utcnow().timestamp())
-    blob_name = f"uploads/{user.id}/{timestamp}_{uuid.uuid4().hex[:8]}.{ext}"
+    timestamp = int(time.time())
+    blob_name = f"uploads/{user.id}/{timestamp}_{secrets.token_hex(4)}.{ext}"
     
     blob = bucket.blob(blob_name)
     
     # Upload from file-like object
-    # Note: async read from FastAPI UploadFile, then synchronous upload to Firebase Storage (which uses requests)
-    # Ideally should use run_in_executor for blocking upload in async func
-    content = await file.read()
+    # Note: the upload to Firebase Storage is synchronous (it uses requests), so it
+    # runs in a worker thread to keep the event loop free. It streams straight from
+    # the UploadFile's spooled temp file instead of reading it all into memory first.
+    # Passing the size keeps files under the chunk threshold on the one-request
+    # multipart upload; without it every upload opens a resumable session.
     
     # Set public? Or generic access?
     # For now, let's just upload.
-    blob.upload_from_string(content, content_type=file.content_type)
+    await asyncio.to_thread(blob.upload_from_file, file.file, size=file.size,
+                            content_type=file.content_type, rewind=True)
     
     # Make public (optional, depending on security)
     # blob.make_public()
     # url = blob.public_url
 
     # Or generic signed URL
-    url = blob.generate_signed_url(expiration=dt.timedelta(days=7))
+    url = await asyncio.to_thread(blob.generate_signed_url, expiration=dt.timedelta(days=7))
 
     return {
         "ok": True,
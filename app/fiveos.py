@@ -3,8 +3,10 @@
 ====================
 Endpoints for creating, joining, playing, and managing 5Os games.
 """
+import asyncio
 import logging
 import random
+import secrets
 import string
 import statistics
 from pathlib import Path
@@ -12,6 +14,8 @@ import datetime as dt
 
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.templating import Jinja2Templates
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore as firestore_module
 from pydantic import BaseModel
 
 from app import db as db_module
@@ -37,6 +41,9 @@ SUITS = ["hearts", "diamonds", "clubs", "spades"]
 RANKS = list(range(1, 14))  # 1=Ace .. 13=King
 FULL_DECK = [{"suit": s, "rank": r} for s in SUITS for r in RANKS]
 
+# Cards of each rank in a full deck
+_FULL_RANK_COUNTS = {r: len(SUITS) for r in RANKS}
+
 RANK_NAMES = {1: "A", 11: "J", 12: "Q", 13: "K"}
 SUIT_SYMBOLS = {"hearts": "♥", "diamonds": "♦", "clubs": "♣", "spades": "♠"}
 
@@ -49,25 +56,33 @@ def card_label(card):
 
 def compute_actuals(deck_15):
     """Compute the 3 actual values from the 15 cards."""
-    ranks_in = [c["rank"] for c in deck_15]
-    ranks_present = set(ranks_in)
+    # One pass over the 15 cards: the total, the odd-rank part of it, and
+    # which ranks turned up.
+    ranks_present = set()
+    q3 = odd_sum = 0
+    for c in deck_15:
+        r = c["rank"]
+        ranks_present.add(r)
+        q3 += r
+        if r % 2 == 1:
+            odd_sum += r
 
     # Q1: sum of ranks NOT in the 15 cards
     q1 = sum(r for r in RANKS if r not in ranks_present)
 
     # Q2: odd-rank sum minus even-rank sum
-    odd_sum = sum(r for r in ranks_in if r % 2 == 1)
-    even_sum = sum(r for r in ranks_in if r % 2 == 0)
-    q2 = odd_sum - even_sum
-
-    # Q3: sum of all 15 card ranks
-    q3 = sum(ranks_in)
+    q2 = odd_sum - (q3 - odd_sum)
 
     return {"q1": q1, "q2": q2, "q3": q3}
 
 
+_JOIN_CODE_ALPHABET = string.ascii_uppercase + string.digits
+
+
 def generate_join_code():
-    return "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
+    # Drawn from the OS CSPRNG: the code is all it takes to join a game, and it
+    # leaves the module-level random state to the deck shuffles.
+    return "".join(secrets.choice(_JOIN_CODE_ALPHABET) for _ in range(6))
 
 
 # ---- Request schemas ----
@@ -176,10 +191,9 @@ async def join_game(req: JoinRequest, user: User = Depends(current_user)):
         "username": user.username,
         "team": "",  # Admin assigns later
     }
-    players = game_data.get("players", [])
-    players.append(player_entry)
-
-    await doc.reference.update({"players": players})
+    # ArrayUnion appends on the server, so players joining at the same moment
+    # don't overwrite each other's entries.
+    await doc.reference.update({"players": firestore_module.ArrayUnion([player_entry])})
 
     return {"ok": True, "game_id": doc.id}
 
@@ -188,7 +202,16 @@ async def join_game(req: JoinRequest, user: User = Depends(current_user)):
 @router.post("/game/{game_id}/team")
 async def assign_team(game_id: str, req: AssignTeamRequest, user: User = Depends(current_user)):
     """Admin assigns a player to a team."""
-    doc = await db_module.db.collection("fiveos_games").document(game_id).get()
+    game_ref = db_module.db.collection("fiveos_games").document(game_id)
+    await _assign_team_txn(db_module.db.transaction(), game_ref, user, req.user_id, req.team.upper())
+    return {"ok": True}
+
+
+@firestore_module.async_transactional
+async def _assign_team_txn(transaction, game_ref, user: User, player_id: str, team: str):
+    """Set one player's team inside a transaction, so a join or another
+    assignment landing at the same time is retried rather than overwritten."""
+    doc = await game_ref.get(transaction=transaction)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Game not found")
 
@@ -198,16 +221,15 @@ async def assign_team(game_id: str, req: AssignTeamRequest, user: User = Depends
 
     found = False
     for p in players:
-        if p["user_id"] == req.user_id:
-            p["team"] = req.team.upper()
+        if p["user_id"] == player_id:
+            p["team"] = team
             found = True
             break
 
     if not found:
         raise HTTPException(status_code=404, detail="Player not in game")
 
-    await doc.reference.update({"players": players})
-    return {"ok": True}
+    transaction.update(game_ref, {"players": players})
 
 
 # ---- Admin: Advance round ----
@@ -243,7 +265,6 @@ async def advance_round(game_id: str, user: User = Depends(current_user)):
     deck_15 = game_data["deck_15"]
     common_cards = game_data.get("common_cards", {})
     players = game_data.get("players", [])
-    player_cards = game_data.get("player_cards", {})
 
     # Build pool excluding common cards so no player gets a common card
     common_set = set()
@@ -253,16 +274,15 @@ async def advance_round(game_id: str, user: User = Depends(current_user)):
     if not pool:
         pool = deck_15  # fallback if all 15 are common (shouldn't happen)
 
-    round_cards = {}
-    for p in players:
-        card = random.choice(pool)
-        round_cards[p["user_id"]] = card
-
-    player_cards[str(next_round)] = round_cards
+    # One independent draw per player, so two players can get the same card
+    dealt = random.choices(pool, k=len(players))
+    round_cards = {p["user_id"]: card for p, card in zip(players, dealt)}
 
+    # Write just this round's cards under player_cards.<round> rather than
+    # sending the whole map of earlier rounds back with it.
     await doc.reference.update({
         "status": f"round_{next_round}",
-        "player_cards": player_cards,
+        f"player_cards.{next_round}": round_cards,
     })
 
     return {"ok": True, "status": f"round_{next_round}"}
@@ -317,16 +337,6 @@ async def submit_answers(game_id: str, req: SubmitRequest, user: User = Depends(
     if str(user.id) not in player_ids:
         raise HTTPException(status_code=403, detail="You are not in this game")
 
-    # Check for existing submission (prevent double submit)
-    q = db_module.db.collection("fiveos_submissions") \
-        .where("game_id", "==", game_id) \
-        .where("round", "==", current_round) \
-        .where("user_id", "==", str(user.id)) \
-        .limit(1)
-    existing = await q.get()
-    if existing:
-        raise HTTPException(status_code=400, detail="Already submitted for this round")
-
     submission = {
         "game_id": game_id,
         "round": current_round,
@@ -336,7 +346,13 @@ async def submit_answers(game_id: str, req: SubmitRequest, user: User = Depends(
         "est_q3": req.est_q3,
     }
 
-    await db_module.db.collection("fiveos_submissions").document().set(submission)
+    # One document per player per round; create() fails if it already exists,
+    # which blocks a double submit without a query beforehand.
+    submission_id = f"{game_id}_{current_round}_{user.id}"
+    try:
+        await db_module.db.collection("fiveos_submissions").document(submission_id).create(submission)
+    except AlreadyExists:
+        raise HTTPException(status_code=400, detail="Already submitted for this round")
 
     return {"ok": True}
 
@@ -345,12 +361,20 @@ async def submit_answers(game_id: str, req: SubmitRequest, user: User = Depends(
 @router.get("/game/{game_id}/state")
 async def game_state(game_id: str, user: User = Depends(current_user)):
     """Get current game state for a player."""
-    doc = await db_module.db.collection("fiveos_games").document(game_id).get()
+    # The game and this player's submissions in parallel. Only a finished game
+    # reads everyone's, for the PnL below.
+    uid = str(user.id)
+    my_subs = db_module.db.collection("fiveos_submissions") \
+        .where("game_id", "==", game_id) \
+        .where("user_id", "==", uid)
+    doc, sub_docs = await asyncio.gather(
+        db_module.db.collection("fiveos_games").document(game_id).get(),
+        my_subs.get(),
+    )
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Game not found")
 
     game_data = doc.to_dict()
-    uid = str(user.id)
     is_admin = user.is_admin
     status = game_data["status"]
     players = game_data.get("players", [])
@@ -402,11 +426,6 @@ async def game_state(game_id: str, user: User = Depends(current_user)):
     if is_admin:
         result["all_player_cards"] = player_cards
 
-    # Fetch player's submissions
-    q = db_module.db.collection("fiveos_submissions") \
-        .where("game_id", "==", game_id) \
-        .where("user_id", "==", uid)
-    sub_docs = await q.get()
     for sd in sub_docs:
         s = sd.to_dict()
         result["my_submissions"][str(s["round"])] = {
@@ -415,9 +434,9 @@ async def game_state(game_id: str, user: User = Depends(current_user)):
 
     # If game is finished, include actual values and PnL
     if status == "finished":
-        result["actuals"] = compute_actuals(game_data["deck_15"])
+        result["actuals"] = actuals = compute_actuals(game_data["deck_15"])
         result["deck_15"] = game_data["deck_15"]
-        result["pnl"] = await _compute_pnl(game_id, game_data)
+        result["pnl"] = await _compute_pnl(game_id, game_data, actuals)
         # Compute optimal estimates for this user based on their known cards
         result["optimal"] = _compute_optimal_estimates(game_data, uid)
         result["feedback"] = (game_data.get("feedback") or {}).get(uid)
@@ -431,7 +450,19 @@ def _compute_optimal_estimates(game_data: dict, user_id: str):
     common_cards = game_data.get("common_cards", {})
 
     optimal = {}
-    known_cards = []  # accumulate known cards across rounds
+    # Distinct cards seen so far, and how many cards of each rank are still
+    # unseen. Updated as cards are revealed, so each round works from 13 counts
+    # instead of rescanning the 52-card deck.
+    known_set = set()
+    known_ranks = []
+    remaining = dict(_FULL_RANK_COUNTS)
+
+    def reveal(card):
+        key = (card["suit"], card["rank"])
+        if key not in known_set:  # same card could appear twice
+            known_set.add(key)
+            known_ranks.append(card["rank"])
+            remaining[card["rank"]] -= 1
 
     for rnd in range(1, 6):
         rnd_key = str(rnd)
@@ -439,30 +470,20 @@ def _compute_optimal_estimates(game_data: dict, user_id: str):
         # Add this round's private card
         rnd_player_cards = player_cards.get(rnd_key, {})
         if user_id in rnd_player_cards:
-            known_cards.append(rnd_player_cards[user_id])
+            reveal(rnd_player_cards[user_id])
 
         # Add common card for odd rounds
         if rnd % 2 == 1 and rnd_key in common_cards:
-            known_cards.append(common_cards[rnd_key])
-
-        # Deduplicate known cards (same card could appear twice)
-        known_set = set()
-        unique_known = []
-        for c in known_cards:
-            key = (c["suit"], c["rank"])
-            if key not in known_set:
-                known_set.add(key)
-                unique_known.append(c)
-
-        known_count = len(unique_known)
+            reveal(common_cards[rnd_key])
+
+        known_count = len(known_set)
         unknown_count = 15 - known_count
-        known_ranks = [c["rank"] for c in unique_known]
         known_rank_sum = sum(known_ranks)
 
-        # Remaining pool: full deck minus known cards
-        remaining_pool = [c for c in FULL_DECK if (c["suit"], c["rank"]) not in known_set]
-        if remaining_pool:
-            avg_remaining = sum(c["rank"] for c in remaining_pool) / len(remaining_pool)
+        # Unseen cards: full deck minus known cards
+        total_remaining = sum(remaining.values())
+        if total_remaining:
+            avg_remaining = sum(r * n for r, n in remaining.items()) / total_remaining
         else:
             avg_remaining = 7  # fallback
 
@@ -472,14 +493,15 @@ def _compute_optimal_estimates(game_data: dict, user_id: str):
         # Q2: odd-rank sum minus even-rank sum
         known_odd = sum(r for r in known_ranks if r % 2 == 1)
         known_even = sum(r for r in known_ranks if r % 2 == 0)
-        remaining_odd = [c["rank"] for c in remaining_pool if c["rank"] % 2 == 1]
-        remaining_even = [c["rank"] for c in remaining_pool if c["rank"] % 2 == 0]
-        avg_odd = sum(remaining_odd) / len(remaining_odd) if remaining_odd else 0
-        avg_even = sum(remaining_even) / len(remaining_even) if remaining_even else 0
+        odd_count = sum(n for r, n in remaining.items() if r % 2 == 1)
+        even_count = total_remaining - odd_count
+        odd_sum = sum(r * n for r, n in remaining.items() if r % 2 == 1)
+        even_sum = sum(r * n for r, n in remaining.items() if r % 2 == 0)
+        avg_odd = odd_sum / odd_count if odd_count else 0
+        avg_even = even_sum / even_count if even_count else 0
         # Expected count of odd vs even among unknown cards
-        total_remaining = len(remaining_pool)
         if total_remaining > 0:
-            frac_odd = len(remaining_odd) / total_remaining
+            frac_odd = odd_count / total_remaining
         else:
             frac_odd = 0.5
         exp_odd_count = unknown_count * frac_odd
@@ -496,7 +518,7 @@ def _compute_optimal_estimates(game_data: dict, user_id: str):
             if rank in known_ranks_set:
                 continue  # This rank is in the 15, contributes 0
             # Probability none of the unknown cards have this rank
-            cards_with_rank = sum(1 for c in remaining_pool if c["rank"] == rank)
+            cards_with_rank = remaining[rank]
             if total_remaining > 0 and unknown_count > 0:
                 # Approximate prob this rank is absent from unknowns
                 prob_absent_per_draw = 1 - cards_with_rank / total_remaining
@@ -517,16 +539,16 @@ def _compute_optimal_estimates(game_data: dict, user_id: str):
 async def _record_scores(game_id: str, game_data: dict) -> None:
     """Rate each player, and write them a note on which estimate let them down."""
     try:
-        pnl = await _compute_pnl(game_id, game_data)
         actuals = compute_actuals(game_data["deck_15"])
+        docs = await db_module.db.collection("fiveos_submissions") \
+            .where("game_id", "==", game_id).get()
+        submissions = [d.to_dict() for d in docs]
+        pnl = await _compute_pnl(game_id, game_data, actuals, submissions)
 
         # Each player's own submissions, so the coaching can talk about which of
         # the three statistics they misread and in which direction.
         subs_by_user = {}
-        docs = await db_module.db.collection("fiveos_submissions") \
-            .where("game_id", "==", game_id).get()
-        for d in docs:
-            s = d.to_dict()
+        for s in submissions:
             subs_by_user.setdefault(s["user_id"], []).append(s)
 
         feedback_by_user = {}
@@ -550,20 +572,25 @@ async def _record_scores(game_id: str, game_data: dict) -> None:
         log.warning("5Os score recording failed for game %s", game_id, exc_info=True)
 
 
-async def _compute_pnl(game_id: str, game_data: dict):
-    """Compute PnL for all players with per-round breakdown."""
-    actuals = compute_actuals(game_data["deck_15"])
+async def _compute_pnl(game_id: str, game_data: dict, actuals: dict | None = None,
+                       submissions: list | None = None):
+    """Compute PnL for all players with per-round breakdown.
+
+    Pass ``actuals`` and the game's ``submissions`` (as dicts) when the caller
+    already has them; otherwise they are computed and fetched here.
+    """
+    if actuals is None:
+        actuals = compute_actuals(game_data["deck_15"])
     medians = game_data.get("round_medians", {})
     players = game_data.get("players", [])
 
-    # Fetch all submissions
-    q = db_module.db.collection("fiveos_submissions").where("game_id", "==", game_id)
-    docs = await q.get()
+    if submissions is None:
+        q = db_module.db.collection("fiveos_submissions").where("game_id", "==", game_id)
+        submissions = [d.to_dict() for d in await q.get()]
 
     # Group submissions by user
     user_subs = {}
-    for d in docs:
-        s = d.to_dict()
+    for s in submissions:
         uid = s["user_id"]
         rnd = str(s["round"])
         if uid not in user_subs:
@@ -594,19 +621,17 @@ async def _compute_pnl(game_id: str, game_data: dict):
                     actual = actuals[qkey]
 
                     # Position: est > median → long, est < median → short
-                    # est == median → random 50/50
+                    # est == median → 50/50, settled once per game/player/round/
+                    # quantity so every poll of a finished game shows the same PnL
                     if est > med:
-                        pnl = actual - med
+                        side = 1
                     elif est < med:
-                        pnl = med - actual
+                        side = -1
                     else:
-                        # 50/50 random
-                        if random.random() < 0.5:
-                            pnl = actual - med
-                        else:
-                            pnl = med - actual
+                        coin = random.Random(f"{game_id}:{uid}:{rnd}:{qkey}").random()
+                        side = 1 if coin < 0.5 else -1
                     fee = abs(est - med) / 3
-                    rnd_pnl += pnl - fee
+                    rnd_pnl += side * (actual - med) - fee
 
             total_pnl += rnd_pnl
             round_pnls.append(round(total_pnl, 2))  # cumulative
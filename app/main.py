@@ -26,7 +26,7 @@ from app.db import init_firestore
 from app import db as db_module
 from google.cloud import firestore as firestore_module
 from google.cloud.firestore import FieldFilter
-from app.auth import router as auth_router, current_user
+from app.auth import router as auth_router, current_user, username_ref
 from app.models import User, Order as DBOrder, Trade as DBTrade # explicit import
 from app.me import router as me_router
 from app.state import books, locks
@@ -79,9 +79,12 @@ async def lifespan(application: FastAPI):
             log.info("✅ Admin user created: username='admin'")
         else:
             d = docs[0]
+            admin_uid = d.id
             if not d.get("is_admin"):
                 await d.reference.update({"is_admin": True})
             log.info("✅ Admin user verified: admin")
+        # Keep the name reserved so signup can't take it
+        await username_ref("admin").set({"uid": admin_uid})
 
     except Exception as e:
         log.warning("⚠️ Admin user setup error: %s", e)
@@ -277,6 +280,7 @@ async def _bot_fill_handler(symbol: str, fills: list) -> None:
             )
 
         await batch.commit()
+        admin.invalidate_stats_cache()
         log.info("[MM] Recorded %d sweep fill(s) for %s", len(fills), symbol)
     except Exception:
         import traceback
@@ -779,7 +783,12 @@ async def submit_order(
     # Use order_id as Document ID for easy lookup? Or auto-id?
     # Using auto-id is safer for collisions if uuid fails (unlikely), but using order_id as key is faster lookup.
     # Let's use order_id as doc id.
-    await db_module.db.collection("orders").document(order_id).set(db_order.model_dump(exclude={"id"}))
+    # The owner's order count rides in the same batch (see User.orders_count)
+    order_batch = db_module.db.batch()
+    order_batch.set(db_module.db.collection("orders").document(order_id), db_order.model_dump(exclude={"id"}))
+    order_batch.update(db_module.db.collection("users").document(str(user.id)),
+                       {"orders_count": firestore_module.Increment(1)})
+    await order_batch.commit()
 
     # Create in-memory order
     order = BookOrder(
@@ -859,6 +868,8 @@ async def submit_order(
         total_filled += q
 
     await batch.commit()
+    if fills:
+        admin.invalidate_stats_cache()
     log.debug("Batch committed for %s", symbol)
 
     # Update order status in database
@@ -1,5 +1,5 @@
 from __future__ import annotations
-import io, time, datetime as dt
+import asyncio, io, time, datetime as dt
 from typing import Any, Dict, List, Optional
 from decimal import Decimal
 
@@ -8,6 +8,7 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app import db as db_module
 from google.cloud import firestore
+from google.cloud.firestore import FieldFilter
 from app.auth import current_user
 from app.models import User, Trade as DBTrade, Order as DBOrder
 
@@ -21,6 +22,27 @@ def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
+_EPOCH = dt.datetime.min.replace(tzinfo=dt.timezone.utc)
+
+
+async def _user_trades(uid: str) -> List[DBTrade]:
+    """Every trade the user is on either side of, oldest first.
+
+    Two equality queries run side by side instead of one OR query: each is a
+    plain single-field index lookup, and together they cost one round-trip.
+    """
+    trades_ref = db_module.db.collection("trades")
+    bought, sold = await asyncio.gather(
+        trades_ref.where(filter=FieldFilter("buyer_id", "==", uid)).get(),
+        trades_ref.where(filter=FieldFilter("seller_id", "==", uid)).get(),
+    )
+    # A self-trade comes back from both queries
+    docs = {d.id: d for d in bought + sold}
+    trades = [DBTrade(id=d.id, **d.to_dict()) for d in docs.values()]
+    trades.sort(key=lambda t: t.created_at or _EPOCH)
+    return trades
+
+
 @router.get("/me")
 async def me(user: User = Depends(current_user)):
     """Simple identity endpoint used by the header/login UI."""
@@ -37,21 +59,7 @@ async def me_summary(
 
     # Fetch all trades for this user
     uid = str(user.id)
-    
-    # Firestore query
-    # Need OR query for buyer_id == uid OR seller_id == uid
-    # Firestore supports Filter since recent versions
-    from google.cloud.firestore import FieldFilter, Or
-
-    trades_ref = db_module.db.collection("trades")
-    # Filter(FieldPath("param"), "==", value)
-    filter_buy = FieldFilter("buyer_id", "==", uid)
-    filter_sell = FieldFilter("seller_id", "==", uid)
-    
-    q = trades_ref.where(filter=Or(filters=[filter_buy, filter_sell])).order_by("created_at")
-    docs = await q.get()
-    
-    trades = [DBTrade(id=d.id, **d.to_dict()) for d in docs]
+    trades = await _user_trades(uid)
 
     # Build positions from trades
     positions = {}
@@ -181,19 +189,10 @@ async def me_pnl(
         user: User = Depends(current_user)
 ):
     """Return a time series for the P&L chart."""
-    from google.cloud.firestore import FieldFilter, Or
-    
     pts: List[Dict[str, float]] = []
     uid = str(user.id)
 
-    trades_ref = db_module.db.collection("trades")
-    filter_buy = FieldFilter("buyer_id", "==", uid)
-    filter_sell = FieldFilter("seller_id", "==", uid)
-    
-    q = trades_ref.where(filter=Or(filters=[filter_buy, filter_sell])).order_by("created_at")
-    docs = await q.get()
-    
-    trades = [DBTrade(id=d.id, **d.to_dict()) for d in docs]
+    trades = await _user_trades(uid)
 
     # Track positions to calculate realized P&L over time
     positions: Dict[str, Dict[str, Decimal]] = {}
@@ -576,7 +575,7 @@ async def upload_my_cv(
 
     blob_name = f"cvs/{grad_year}/{track_folder}/{user.id}.pdf"
     blob = bucket.blob(blob_name)
-    blob.upload_from_string(content, content_type="application/pdf")
+    await asyncio.to_thread(blob.upload_from_string, content, content_type="application/pdf")
 
     await db_module.db.collection("users").document(str(user.id)).update({
         "cv_blob_path": blob_name,
@@ -35,6 +35,9 @@ class User(BaseModel):
     level_set_at: Optional[dt.datetime] = None
     placement_answers: Optional[dict] = None
     placement_points: Optional[int] = None
+    # Orders ever placed, bumped with each order write so the admin dashboard
+    # need not scan the orders collection (scripts/backfill_order_counts.py).
+    orders_count: int = Field(default=0)
 
 class Order(BaseModel):
     id: Optional[str] = None
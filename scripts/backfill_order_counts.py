@@ -0,0 +1,77 @@
+"""Set `users.orders_count` from the orders collection.
+
+The admin dashboard reads each user's order count from their user document,
+which is bumped with every order placed from then on. Orders placed before the
+field existed are not in it, so this counts them once.
+
+Dry run by default:
+
+    python scripts/backfill_order_counts.py
+
+Write the changes:
+
+    python scripts/backfill_order_counts.py --write
+
+Overwrites the stored count with the true one, so it is safe to re-run.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from google.cloud import firestore                               # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CRED = REPO_ROOT / "service-account.json"
+
+
+def init(cred_path: Path) -> firestore.Client:
+    if not cred_path.exists():
+        raise SystemExit(f"No credentials at {cred_path}")
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", str(cred_path))
+    return firestore.Client.from_service_account_json(str(cred_path))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--write", action="store_true", help="apply (default is a dry run)")
+    ap.add_argument("--credentials", default=str(DEFAULT_CRED))
+    args = ap.parse_args()
+
+    db = init(Path(args.credentials))
+
+    counts = Counter()
+    for doc in db.collection("orders").select(["user_id"]).stream():
+        uid = (doc.to_dict() or {}).get("user_id")
+        if uid:
+            counts[uid] += 1
+
+    changed = []
+    for doc in db.collection("users").select(["username", "orders_count"]).stream():
+        data = doc.to_dict() or {}
+        true_count = counts.get(doc.id, 0)
+        if data.get("orders_count") == true_count:
+            continue
+        changed.append((data.get("username") or "(no username)", data.get("orders_count"), true_count))
+        if args.write:
+            doc.reference.update({"orders_count": true_count})
+
+    print(f"Orders counted       : {sum(counts.values())}")
+    print(f"Users to correct     : {len(changed)}")
+    for username, old, new in changed:
+        print(f"  {username:20s} {old!s:>6} -> {new}")
+
+    if changed and not args.write:
+        print("\nDry run — nothing written. Re-run with --write to apply.")
+    elif changed:
+        print(f"\nUpdated {len(changed)} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Claim `usernames/{username}` for every existing user.
+
+Signup checks whether a name is taken with a keyed read of the usernames
+collection rather than a query over users. Accounts created before that
+collection existed have no claim, so their names would look free; this
+writes one per user.
+
+Dry run by default:
+
+    python scripts/backfill_usernames.py
+
+Write the changes:
+
+    python scripts/backfill_usernames.py --write
+
+Existing claims are never overwritten, so it is safe to re-run. Names shared
+by several accounts (possible before claims existed) go to the oldest account
+and are listed for a manual look.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from google.cloud import firestore                               # noqa: E402
+
+from app.auth import valid_username                              # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CRED = REPO_ROOT / "service-account.json"
+
+
+def init(cred_path: Path) -> firestore.Client:
+    if not cred_path.exists():
+        raise SystemExit(f"No credentials at {cred_path}")
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", str(cred_path))
+    return firestore.Client.from_service_account_json(str(cred_path))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--write", action="store_true", help="apply (default is a dry run)")
+    ap.add_argument("--credentials", default=str(DEFAULT_CRED))
+    args = ap.parse_args()
+
+    db = init(Path(args.credentials))
+
+    owners = defaultdict(list)
+    for doc in db.collection("users").select(["username", "created_at"]).stream():
+        data = doc.to_dict() or {}
+        if data.get("username"):
+            owners[data["username"]].append((str(data.get("created_at") or ""), doc.id))
+
+    claimed = {doc.id for doc in db.collection("usernames").select([]).stream()}
+
+    to_claim, shared, skipped = [], [], []
+    for name, accounts in sorted(owners.items()):
+        if not valid_username(name):
+            skipped.append(name)
+            continue
+        accounts.sort()
+        if len(accounts) > 1:
+            shared.append((name, [uid for _, uid in accounts]))
+        if name not in claimed:
+            to_claim.append((name, accounts[0][1]))
+
+    if args.write:
+        for name, uid in to_claim:
+            db.collection("usernames").document(name).create({"uid": uid})
+
+    print(f"Usernames in use     : {len(owners)}")
+    print(f"Already claimed      : {len(claimed)}")
+    print(f"Claims to write      : {len(to_claim)}")
+    for name, uid in to_claim:
+        print(f"  {name:20s} -> {uid}")
+    if shared:
+        print(f"\nShared by several accounts ({len(shared)}), claimed for the oldest:")
+        for name, uids in shared:
+            print(f"  {name:20s} {', '.join(uids)}")
+    if skipped:
+        print(f"\nNot valid as a document id, skipped ({len(skipped)}): {', '.join(skipped)}")
+
+    if to_claim and not args.write:
+        print("\nDry run — nothing written. Re-run with --write to apply.")
+    elif to_claim:
+        print(f"\nClaimed {len(to_claim)} usernames.")
+
+
+if __name__ == "__main__":
+    main()
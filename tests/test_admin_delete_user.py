@@ -46,6 +46,9 @@ class FakeQuery:
     def where(self, *args, **kwargs):
         return self
 
+    def select(self, fields):
+        return self
+
     async def get(self):
         return self._docs
 
@@ -63,6 +66,27 @@ class FakeCollection:
         rows = self._store.get(self.name, {})
         return FakeQuery([FakeDoc(k, v, self._store, self.name) for k, v in rows.items()])
 
+    def select(self, fields):
+        return self
+
+    async def stream(self):
+        for k, v in list(self._store.get(self.name, {}).items()):
+            yield FakeDoc(k, v, self._store, self.name)
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self._store = store
+        self._deletes = []
+
+    def delete(self, ref):
+        self._deletes.append(ref)
+
+    async def commit(self):
+        self._store["batch_commits"] = self._store.get("batch_commits", 0) + 1
+        for ref in self._deletes:
+            await ref.delete()
+
 
 class FakeDB:
     def __init__(self, store):
@@ -71,6 +95,9 @@ class FakeDB:
     def collection(self, name):
         return FakeCollection(name, self._store)
 
+    def batch(self):
+        return FakeBatch(self._store)
+
 
 class FakeUserNotFound(Exception):
     pass
@@ -88,6 +115,7 @@ def store():
         "trades": {},
         "player_scores": {"uid-123": {"overall": 61}},
         "crash_ledger_profiles": {"uid-123": {"xp": 400}},
+        "usernames": {"alice": {"uid": "uid-123"}, "root": {"uid": "admin-1"}},
     }
 
 
@@ -143,6 +171,15 @@ class TestDeleteUser:
         assert "uid-123" not in store["player_scores"]
         assert "uid-123" not in store["crash_ledger_profiles"]
 
+    def test_the_username_is_freed_for_a_new_signup(self, wired, store):
+        run(admin.delete_user("uid-123", admin=ADMIN))
+        assert "alice" not in store["usernames"]
+
+    def test_a_name_claimed_by_someone_else_is_left_alone(self, wired, store):
+        store["usernames"]["alice"] = {"uid": "other-uid"}
+        run(admin.delete_user("uid-123", admin=ADMIN))
+        assert store["usernames"]["alice"] == {"uid": "other-uid"}
+
     def test_the_leaderboard_cache_is_invalidated(self, wired):
         run(admin.delete_user("uid-123", admin=ADMIN))
         assert wired["cache_invalidated"] == 1
@@ -172,6 +209,14 @@ class TestDeleteUser:
         assert "could NOT be removed" in result["auth_note"]
         assert "uid-123" not in store["users"]
 
+    def test_orders_and_trades_go_in_one_batch_each_trade_once(self, wired, store):
+        store["orders"] = {"o1": {"user_id": "uid-123"}, "o2": {"user_id": "uid-123"}}
+        store["trades"] = {"t1": {"buyer_id": "uid-123", "seller_id": "uid-123"}}
+        run(admin.delete_user("uid-123", admin=ADMIN))
+        assert store["orders"] == {} and store["trades"] == {}
+        assert store["batch_commits"] == 1
+        assert [d for d in store["deleted"] if d[0] == "trades"] == [("trades", "t1")]
+
     def test_admins_cannot_be_deleted(self, wired, store):
         from fastapi import HTTPException
         with pytest.raises(HTTPException) as exc:
@@ -184,3 +229,17 @@ class TestDeleteUser:
         with pytest.raises(HTTPException) as exc:
             run(admin.delete_user("nope", admin=ADMIN))
         assert exc.value.status_code == 404
+
+
+class TestDeleteAllInCollection:
+    def test_everything_goes_in_full_batches(self, wired, store, monkeypatch):
+        monkeypatch.setattr(admin, "BATCH_LIMIT", 3)
+        monkeypatch.setattr(admin, "BATCH_CONCURRENCY", 2)
+        store["trades"] = {f"t{i}": {} for i in range(7)}
+        run(admin.delete_all_in_collection("trades"))
+        assert store["trades"] == {}
+        assert store["batch_commits"] == 3       # 3 + 3 + 1
+
+    def test_an_empty_collection_commits_nothing(self, wired, store):
+        run(admin.delete_all_in_collection("trades"))
+        assert "batch_commits" not in store
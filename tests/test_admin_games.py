@@ -0,0 +1,77 @@
+"""Creating custom games: symbol validation and the document it writes."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from google.api_core.exceptions import AlreadyExists
+
+from app import admin
+from app.models import User
+
+
+class _DocRef:
+    def __init__(self, rows, doc_id):
+        self._rows = rows
+        self.id = doc_id
+
+    async def create(self, data):
+        if self.id in self._rows:
+            raise AlreadyExists(f"{self.id} exists")
+        self._rows[self.id] = data
+
+
+class _GamesDB:
+    """custom_games keyed by document id; create() fails on an existing id like Firestore."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def collection(self, name):
+        assert name == "custom_games"
+        return self
+
+    def document(self, doc_id):
+        return _DocRef(self.rows, doc_id)
+
+
+@pytest.fixture
+def games_db(monkeypatch):
+    db = _GamesDB()
+    monkeypatch.setattr(admin.db_module, "db", db, raising=False)
+    monkeypatch.setattr(admin, "books", {})
+    yield db
+    admin.invalidate_games_cache()
+
+
+ADMIN = User(id="admin-1", username="root", is_admin=True)
+
+
+def _create(symbol):
+    game = admin.GameCreate(symbol=symbol, name="Test", instructions="", expected_value=1.0)
+    return asyncio.run(admin.create_game(game, admin=ADMIN))
+
+
+class TestCreateGame:
+    def test_symbol_is_normalized_and_becomes_the_document_id(self, games_db):
+        out = _create("  gamex_1 ")
+        assert out["game"]["symbol"] == "GAMEX_1"
+        assert games_db.rows["game_gamex_1"]["symbol"] == "GAMEX_1"
+        assert "GAMEX_1" in admin.books
+
+    @pytest.mark.parametrize("symbol", ["GAME", "STOCK", "GAMEX/1", "GAME X", "XGAME1"])
+    def test_malformed_symbols_are_rejected_before_any_write(self, games_db, symbol):
+        with pytest.raises(HTTPException) as exc:
+            _create(symbol)
+        assert exc.value.status_code == 400
+        assert games_db.rows == {}
+
+    def test_an_existing_symbol_is_rejected_without_touching_its_game(self, games_db):
+        _create("GAMEX")
+        games_db.rows["game_gamex"]["expected_value"] = 42.0
+        admin.books["GAMEX"] = existing = object()
+
+        with pytest.raises(HTTPException) as exc:
+            _create("gamex")
+        assert exc.value.status_code == 400
+        assert games_db.rows["game_gamex"]["expected_value"] == 42.0
+        assert admin.books["GAMEX"] is existing
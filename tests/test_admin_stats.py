@@ -0,0 +1,268 @@
+"""Tests for the admin dashboard: the one-pass P&L fold, the games cache, and the page wiring."""
+import asyncio
+import datetime as dt
+from collections import Counter
+
+import pytest
+
+from app import admin
+from app.models import Trade
+
+
+def _trade(n, buyer, seller, price, qty, symbol="GAMEX"):
+    return Trade(
+        symbol=symbol, buyer_id=buyer, seller_id=seller,
+        price=str(price), qty=str(qty),
+        buy_order_id="", sell_order_id="",
+        created_at=dt.datetime(2025, 1, 1, 12, 0, n, tzinfo=dt.timezone.utc),
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_market(monkeypatch):
+    """Stocks have no live price in tests unless a test sets one."""
+    from app import market_data
+    monkeypatch.setattr(market_data, "get_ref_price", lambda sym: None)
+
+
+class TestComputeUserStats:
+    def test_open_positions_are_marked_to_the_game_value(self):
+        pnls, counts = admin.compute_user_stats([_trade(0, "a", "b", 10, 5)], {"GAMEX": 12.0})
+        assert pnls["a"] == pytest.approx(10.0)     # long 5 @ 10, worth 12
+        assert pnls["b"] == pytest.approx(-10.0)    # short 5 @ 10
+        assert counts == {"a": 1, "b": 1}
+
+    def test_closing_a_position_realizes_it(self):
+        trades = [_trade(0, "a", "b", 10, 5), _trade(1, "b", "a", 14, 5)]
+        pnls, counts = admin.compute_user_stats(trades, {"GAMEX": 0.0})
+        assert pnls["a"] == pytest.approx(20.0)
+        assert pnls["b"] == pytest.approx(-20.0)
+        assert counts == {"a": 2, "b": 2}
+
+    def test_trades_are_applied_in_time_order(self):
+        # Handed over newest first; the sell must still close the earlier buy.
+        trades = [_trade(1, "b", "a", 14, 5), _trade(0, "a", "b", 10, 5)]
+        pnls, _ = admin.compute_user_stats(trades, {"GAMEX": 0.0})
+        assert pnls["a"] == pytest.approx(20.0)
+
+    def test_flip_from_long_to_short_rebases_the_cost(self):
+        trades = [_trade(0, "a", "b", 10, 5), _trade(1, "b", "a", 12, 8)]
+        pnls, _ = admin.compute_user_stats(trades, {"GAMEX": 11.0})
+        # +10 realized on the long, then short 3 @ 12 marked at 11 → +3
+        assert pnls["a"] == pytest.approx(13.0)
+
+    def test_each_stock_is_priced_once(self, monkeypatch):
+        from app import market_data
+        asked = []
+        monkeypatch.setattr(market_data, "get_ref_price", lambda sym: asked.append(sym) or 11.0)
+        trades = [_trade(0, "a", "b", 10, 5, symbol="AAPL"), _trade(1, "c", "d", 10, 5, symbol="AAPL")]
+        pnls, _ = admin.compute_user_stats(trades, {})
+        assert asked == ["AAPL"]
+        assert pnls["c"] == pytest.approx(5.0)
+
+    def test_stocks_without_a_price_contribute_realized_only(self):
+        pnls, _ = admin.compute_user_stats([_trade(0, "a", "b", 10, 5, symbol="AAPL")], {})
+        assert pnls["a"] == 0.0
+        assert pnls["b"] == 0.0
+
+
+# ── Expected-value cache ────────────────────────────────────────────────
+
+
+class _GameDoc:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _GamesDB:
+    """custom_games only; ``on_get`` runs mid-fetch to simulate a racing write."""
+
+    def __init__(self, games):
+        self.games = games
+        self.reads = 0
+        self.on_get = None
+
+    def collection(self, name):
+        assert name == "custom_games"
+        return self
+
+    def select(self, fields):
+        return self
+
+    async def get(self):
+        self.reads += 1
+        snapshot = [_GameDoc(dict(g)) for g in self.games]
+        if self.on_get:
+            self.on_get()
+        return snapshot
+
+
+@pytest.fixture
+def games_db(monkeypatch):
+    db = _GamesDB([{"symbol": "GAMEX", "expected_value": 10.0}])
+    monkeypatch.setattr(admin.db_module, "db", db, raising=False)
+    admin.invalidate_games_cache()
+    yield db
+    admin.invalidate_games_cache()
+
+
+class TestGameExpectedValueCache:
+    def test_repeat_reads_within_the_ttl_hit_memory(self, games_db):
+        assert asyncio.run(admin.get_game_expected_values()) == {"GAMEX": 10.0}
+        assert asyncio.run(admin.get_game_expected_values()) == {"GAMEX": 10.0}
+        assert games_db.reads == 1
+
+    def test_the_ttl_expires(self, games_db, monkeypatch):
+        asyncio.run(admin.get_game_expected_values())
+        later = admin.time.monotonic() + admin.GAMES_CACHE_TTL + 1
+        monkeypatch.setattr(admin.time, "monotonic", lambda: later)
+        asyncio.run(admin.get_game_expected_values())
+        assert games_db.reads == 2
+
+    def test_invalidation_picks_up_a_resolved_value(self, games_db):
+        asyncio.run(admin.get_game_expected_values())
+        games_db.games[0]["expected_value"] = 25.0
+        admin.invalidate_games_cache()
+        assert asyncio.run(admin.get_game_expected_values()) == {"GAMEX": 25.0}
+
+    def test_a_write_during_the_fetch_is_not_cached_over(self, games_db):
+        def resolve_mid_fetch():
+            games_db.games[0]["expected_value"] = 25.0
+            admin.invalidate_games_cache()
+        games_db.on_get = resolve_mid_fetch
+
+        # This caller saw the old snapshot; that is fine for this one call…
+        assert asyncio.run(admin.get_game_expected_values()) == {"GAMEX": 10.0}
+        # …but it must not be kept as the fresh value.
+        games_db.on_get = None
+        assert asyncio.run(admin.get_game_expected_values()) == {"GAMEX": 25.0}
+
+
+# ── Dashboard wiring ────────────────────────────────────────────────────
+
+
+class _Snap:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Coll:
+    """Enough of a collection/query for the dashboard: filters are applied for real."""
+
+    def __init__(self, rows, filters=()):
+        self._rows = rows
+        self._filters = filters
+
+    def where(self, field, op, value):
+        assert op == "=="
+        return _Coll(self._rows, self._filters + ((field, value),))
+
+    def select(self, fields):
+        return _Coll({k: {f: v[f] for f in fields if f in v} for k, v in self._rows.items()},
+                     self._filters)
+
+    async def get(self):
+        return [_Snap(k, v) for k, v in self._rows.items()
+                if all(v.get(f) == val for f, val in self._filters)]
+
+
+class _DashboardDB:
+    def __init__(self, store):
+        self._store = store
+        self.opened = Counter()
+
+    def collection(self, name):
+        self.opened[name] += 1
+        return _Coll(self._store.get(name, {}))
+
+
+class _CapturingTemplates:
+    def TemplateResponse(self, name, context):
+        return context
+
+
+def _ts(n):
+    return dt.datetime(2025, 1, 1, 12, 0, n, tzinfo=dt.timezone.utc)
+
+
+@pytest.fixture
+def dashboard(monkeypatch):
+    store = {
+        "users": {
+            "a": {"username": "alice", "orders_count": 2},
+            "b": {"username": "bob", "orders_count": 1},
+            "admin-1": {"username": "root", "is_admin": True},
+        },
+        "trades": {
+            "t1": {"symbol": "GAMEX", "buyer_id": "a", "seller_id": "b", "price": "10", "qty": "5",
+                   "buy_order_id": "", "sell_order_id": "", "created_at": _ts(0)},
+        },
+        "custom_games": {
+            "game_gamex": {"symbol": "GAMEX", "name": "X", "expected_value": 12.0,
+                           "is_active": True, "created_at": _ts(1)},
+            "game_gameold": {"symbol": "GAMEOLD", "name": "Old", "expected_value": 1.0,
+                             "is_active": False, "created_at": _ts(2)},
+        },
+        "fiveos_games": {"f1": {"join_code": "FIVE01", "status": "lobby", "created_at": _ts(3)},
+                         "f2": {"join_code": "FIVE02", "status": "finished", "created_at": _ts(4)}},
+        "headline_games": {"h1": {"join_code": "HEAD01", "status": "lobby", "created_at": _ts(5)}},
+        "poker_auction_games": {"p1": {"join_code": "POKE01", "status": "lobby", "created_at": _ts(6)}},
+        "mental_math_games": {"m1": {"join_code": "MATH01", "status": "lobby", "created_at": _ts(7)}},
+    }
+    monkeypatch.setattr(admin.db_module, "db", _DashboardDB(store), raising=False)
+    monkeypatch.setattr(admin, "templates", _CapturingTemplates())
+    admin.invalidate_games_cache()
+    yield store
+    admin.invalidate_games_cache()
+
+
+class TestAdminDashboard:
+    def render(self):
+        from app.models import User
+        return asyncio.run(admin.admin_dashboard(
+            request=None, user=User(id="admin-1", username="root", is_admin=True)))
+
+    def test_users_get_their_own_counts_and_pnl(self, dashboard):
+        ctx = self.render()
+        rows = {u["id"]: u for u in ctx["users"]}
+        assert rows["a"]["orders"] == 2 and rows["b"]["orders"] == 1
+        assert rows["a"]["trades"] == 1 and rows["b"]["trades"] == 1
+        assert rows["a"]["pnl"] == pytest.approx(10.0)
+        assert rows["b"]["pnl"] == pytest.approx(-10.0)
+        assert rows["admin-1"]["pnl"] == 0.0
+        assert ctx["total_users"] == 3
+        assert ctx["total_trades"] == 1
+        assert [u["id"] for u in ctx["leaderboard"]][:1] == ["a"]
+
+    def test_each_game_collection_lands_under_its_own_type(self, dashboard):
+        games = self.render()["games"]
+        by_type = {g["type"]: g["symbol"] for g in games}
+        assert by_type == {
+            "custom": "GAMEX",
+            "fiveos": "FIVE01",
+            "headline": "HEAD01",
+            "poker_auction": "POKE01",
+            "mental_math": "MATH01",
+        }
+        # Newest first; finished and inactive games are left out.
+        assert [g["symbol"] for g in games] == ["MATH01", "POKE01", "HEAD01", "FIVE01", "GAMEX"]
+
+    def test_a_reload_reuses_the_trade_fold_until_a_trade_lands(self, dashboard):
+        self.render()
+        self.render()
+        assert admin.db_module.db.opened["trades"] == 1
+
+        dashboard["trades"]["t2"] = {
+            "symbol": "GAMEX", "buyer_id": "a", "seller_id": "b", "price": "11", "qty": "1",
+            "buy_order_id": "", "sell_order_id": "", "created_at": _ts(9)}
+        admin.invalidate_stats_cache()
+        rows = {u["id"]: u for u in self.render()["users"]}
+        assert rows["a"]["trades"] == 2
+        assert admin.db_module.db.opened["trades"] == 2
@@ -0,0 +1,293 @@
+"""Sign-in and session tokens: Firebase sign-in, decoding, and the caches in front of the user read."""
+import asyncio
+import json
+import time
+from collections import Counter
+
+import pytest
+from google.api_core.exceptions import AlreadyExists
+from starlette.requests import Request
+
+from app import auth
+
+
+class _Snap:
+    def __init__(self, ref, data):
+        self.id = ref.id
+        self.reference = ref
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Ref:
+    def __init__(self, db, coll, doc_id):
+        self._db = db
+        self._rows = db.store.setdefault(coll, {})
+        self._coll = coll
+        self.id = doc_id
+
+    async def get(self):
+        self._db.reads[self._coll] += 1
+        data = self._rows.get(self.id)
+        snap = _Snap(self, dict(data) if data is not None else None)
+        if self._db.on_get:
+            self._db.on_get()
+        return snap
+
+    async def set(self, data):
+        self._rows[self.id] = data
+
+    async def update(self, data):
+        self._rows[self.id].update(data)
+
+
+class _Batch:
+    """Applies all writes or none, like a Firestore batch commit."""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def create(self, ref, data):
+        self._writes.append(("create", ref, data))
+
+    def set(self, ref, data):
+        self._writes.append(("set", ref, data))
+
+    async def commit(self):
+        self._db.commits += 1
+        for op, ref, _ in self._writes:
+            if op == "create" and ref.id in ref._rows:
+                raise AlreadyExists(f"{ref._coll}/{ref.id}")
+        for _, ref, data in self._writes:
+            ref._rows[ref.id] = data
+
+
+class _Query:
+    def __init__(self, db, coll, field, value):
+        self._db = db
+        self._coll = coll
+        self._match = (field, value)
+
+    def select(self, fields):
+        return self
+
+    def limit(self, n):
+        return self
+
+    async def get(self):
+        self._db.queries += 1
+        field, value = self._match
+        return [_Snap(_Ref(self._db, self._coll, k), v)
+                for k, v in self._db.store.get(self._coll, {}).items() if v.get(field) == value]
+
+
+class _Coll:
+    def __init__(self, db, name):
+        self._db = db
+        self._name = name
+
+    def document(self, doc_id):
+        return _Ref(self._db, self._name, doc_id)
+
+    def where(self, field, op, value):
+        return _Query(self._db, self._name, field, value)
+
+
+class _FakeDB:
+    """users and usernames; ``on_get`` runs mid-read to simulate a racing write."""
+
+    def __init__(self, store):
+        self.store = store
+        self.reads = Counter()
+        self.queries = 0
+        self.commits = 0
+        self.on_get = None
+
+    @property
+    def users(self):
+        return self.store["users"]
+
+    def collection(self, name):
+        return _Coll(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+
+@pytest.fixture
+def users_db(monkeypatch):
+    db = _FakeDB({"users": {"u1": {"username": "alice"}}, "usernames": {"alice": {"uid": "u1"}}})
+    monkeypatch.setattr(auth.db_module, "db", db, raising=False)
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret-" + "x" * 32)
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+    yield db
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Count real signature checks."""
+    calls = []
+    real = auth.jwt.decode
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return real(*args, **kwargs)
+    monkeypatch.setattr(auth.jwt, "decode", counting)
+    return calls
+
+
+def _user(token):
+    return asyncio.run(auth.get_user_from_token(token))
+
+
+class TestGetUserFromToken:
+    def test_a_minted_token_resolves_to_its_user(self, users_db):
+        user = _user(auth.create_token("u1"))
+        assert user.id == "u1" and user.username == "alice"
+
+    def test_tampered_and_unknown_tokens_resolve_to_nobody(self, users_db):
+        token = auth.create_token("u1")
+        assert _user(token[:-2] + "xx") is None
+        assert _user(auth.create_token("ghost")) is None
+
+    def test_repeat_presentations_skip_the_signature_check(self, users_db, decodes):
+        token = auth.create_token("u1")
+        for _ in range(3):
+            assert _user(token).id == "u1"
+        assert decodes == [token]
+
+    def test_a_cache_entry_never_outlives_the_token(self, users_db):
+        token = auth.create_token("u1", max_age=5)
+        _user(token)
+        _, valid_until = auth._token_cache[token]
+        assert valid_until <= time.time() + 5
+
+    def test_a_stale_entry_is_checked_again(self, users_db, decodes):
+        token = auth.create_token("u1")
+        _user(token)
+        auth._token_cache[token] = ("u1", time.time() - 1)
+        assert _user(token).id == "u1"
+        assert len(decodes) == 2
+
+
+class TestUserCache:
+    def test_repeat_requests_within_the_ttl_skip_the_read(self, users_db):
+        token = auth.create_token("u1")
+        _user(token)
+        _user(token)
+        assert users_db.reads["users"] == 1
+
+    def test_the_ttl_expires(self, users_db, monkeypatch):
+        token = auth.create_token("u1")
+        _user(token)
+        later = auth.time.monotonic() + auth.USER_CACHE_TTL + 1
+        monkeypatch.setattr(auth.time, "monotonic", lambda: later)
+        _user(token)
+        assert users_db.reads["users"] == 2
+
+    def test_callers_get_their_own_copy(self, users_db):
+        token = auth.create_token("u1")
+        _user(token).username = "mallory"
+        assert _user(token).username == "alice"
+
+    def test_blacklisting_applies_on_the_next_request(self, users_db):
+        token = auth.create_token("u1")
+        _user(token)
+        users_db.users["u1"]["is_blacklisted"] = True
+        auth.invalidate_user("u1")
+        assert _user(token).is_blacklisted
+
+    def test_an_invalidation_during_the_read_is_not_cached_over(self, users_db):
+        def blacklist_mid_read():
+            users_db.users["u1"]["is_blacklisted"] = True
+            auth.invalidate_user("u1")
+        users_db.on_get = blacklist_mid_read
+        token = auth.create_token("u1")
+
+        assert not _user(token).is_blacklisted
+        users_db.on_get = None
+        assert _user(token).is_blacklisted
+
+    def test_a_deleted_user_is_not_served_from_cache(self, users_db):
+        token = auth.create_token("u1")
+        _user(token)
+        del users_db.users["u1"]
+        auth.invalidate_user("u1")
+        assert _user(token) is None
+
+
+# ── Firebase sign-in ────────────────────────────────────────────────────
+
+
+@pytest.fixture
+def firebase(monkeypatch):
+    """verify_id_token accepts 'token-<uid>' and returns that uid."""
+    def verify(id_token):
+        uid = id_token.removeprefix("token-")
+        return {"uid": uid, "email": f"{uid}@example.com"}
+    monkeypatch.setattr(auth.fb_auth, "verify_id_token", verify)
+
+
+def _sign_in(uid, username=None):
+    request = Request({"type": "http", "scheme": "https", "headers": [], "path": "/auth/firebase",
+                       "query_string": b"", "server": ("test", 443)})
+    return asyncio.run(auth.auth_firebase(request, id_token=f"token-{uid}", username=username))
+
+
+class TestFirebaseSignIn:
+    def test_signup_creates_the_user_under_the_firebase_uid(self, users_db, firebase):
+        resp = _sign_in("u2", username="bob")
+        assert resp.status_code == 200
+        assert users_db.users["u2"]["username"] == "bob"
+        assert users_db.users["u2"]["email"] == "u2@example.com"
+        assert auth.COOKIE_NAME in resp.headers["set-cookie"]
+
+    def test_a_taken_username_is_refused_and_nothing_is_written(self, users_db, firebase):
+        resp = _sign_in("u2", username="alice")
+        assert resp.status_code == 400
+        assert "u2" not in users_db.users
+
+    def test_the_name_check_is_a_keyed_read_not_a_query(self, users_db, firebase):
+        _sign_in("u2", username="bob")
+        assert users_db.reads == {"users": 1, "usernames": 1}
+        assert users_db.queries == 0
+        assert users_db.store["usernames"]["bob"] == {"uid": "u2"}
+
+    def test_the_claim_and_the_user_are_written_in_one_commit(self, users_db, firebase):
+        _sign_in("u2", username="bob")
+        assert users_db.commits == 1
+        assert "bob" in users_db.store["usernames"] and "u2" in users_db.users
+
+    def test_a_name_claimed_after_the_check_still_loses(self, users_db, firebase):
+        def claim_mid_read():
+            if users_db.reads["usernames"]:  # after our name check saw it free
+                users_db.store["usernames"].setdefault("bob", {"uid": "someone-else"})
+        users_db.on_get = claim_mid_read
+        resp = _sign_in("u2", username="bob")
+        assert resp.status_code == 400
+        assert "u2" not in users_db.users
+
+    @pytest.mark.parametrize("name", ["a/b", ".", "..", "__bob__", "____", "x" * 1501, "é" * 751])
+    def test_names_firestore_cant_store_are_refused_before_any_read(self, users_db, firebase, name):
+        resp = _sign_in("u2", username=name)
+        assert resp.status_code == 400
+        assert json.loads(resp.body)["message"] == auth.USERNAME_RULES
+        assert sum(users_db.reads.values()) == 0
+
+    @pytest.mark.parametrize("name", ["__bob", "bob__", "_._", "x" * 1500])
+    def test_names_near_the_limits_are_fine(self, name):
+        assert auth.valid_username(name)
+
+    def test_returning_users_skip_the_username_check(self, users_db, firebase):
+        resp = _sign_in("u1")
+        assert resp.status_code == 200
+        assert users_db.reads == {"users": 1}
+        # Older accounts get their email backfilled
+        assert users_db.users["u1"]["email"] == "u1@example.com"
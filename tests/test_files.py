@@ -0,0 +1,45 @@
+"""File uploads: the blob write and the signed URL it hands back."""
+import asyncio
+import io
+
+from starlette.datastructures import Headers, UploadFile
+
+from app import files
+from app.models import User
+
+
+class _Blob:
+    def __init__(self, name):
+        self.name = name
+        self.uploads = []
+
+    def upload_from_file(self, fh, **kwargs):
+        self.uploads.append((fh.read(), kwargs))
+
+    def generate_signed_url(self, expiration):
+        return f"https://signed/{self.name}"
+
+
+class _Bucket:
+    def __init__(self):
+        self.blobs = []
+
+    def blob(self, name):
+        self.blobs.append(_Blob(name))
+        return self.blobs[-1]
+
+
+class TestUploadFile:
+    def test_streams_the_file_with_its_size(self, monkeypatch):
+        bucket = _Bucket()
+        monkeypatch.setattr(files.db_module, "bucket", bucket, raising=False)
+        upload = UploadFile(io.BytesIO(b"hello"), size=5, filename="notes.txt",
+                            headers=Headers({"content-type": "text/plain"}))
+
+        out = asyncio.run(files.upload_file(upload, user=User(id="u1", username="alice")))
+
+        (blob,) = bucket.blobs
+        assert blob.name.startswith("uploads/u1/") and blob.name.endswith(".txt")
+        # A known size lets the client use a single multipart request
+        assert blob.uploads == [(b"hello", {"size": 5, "content_type": "text/plain", "rewind": True})]
+        assert out == {"ok": True, "filename": blob.name, "url": f"https://signed/{blob.name}"}
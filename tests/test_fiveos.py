@@ -0,0 +1,333 @@
+"""5Os: the true values, the per-round optimal estimates, and the polling endpoint."""
+import asyncio
+import itertools
+from collections import Counter
+
+import pytest
+from fastapi import HTTPException
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+
+from app import fiveos
+from app.models import User
+
+
+def _card(suit, rank):
+    return {"suit": suit, "rank": rank}
+
+
+def _brute_force_estimate(known):
+    """Reference Q3/Q1 for a set of distinct known cards, straight off the 52-card deck."""
+    keys = {(c["suit"], c["rank"]) for c in known}
+    pool = [c for c in fiveos.FULL_DECK if (c["suit"], c["rank"]) not in keys]
+    unknown = 15 - len(keys)
+    q3 = sum(c["rank"] for c in known) + unknown * sum(c["rank"] for c in pool) / len(pool)
+    seen = {c["rank"] for c in known}
+    q1 = sum(r * (1 - sum(1 for c in pool if c["rank"] == r) / len(pool)) ** unknown
+             for r in fiveos.RANKS if r not in seen)
+    return round(q1, 2), round(q3, 2)
+
+
+class TestComputeActuals:
+    def test_the_three_values(self):
+        deck = [_card("hearts", r) for r in range(1, 14)] + [_card("spades", 1), _card("spades", 2)]
+        # Every rank present → Q1 is 0; odds 1..13 (49) + 1, evens 2..12 (42) + 2
+        assert fiveos.compute_actuals(deck) == {"q1": 0, "q2": 50 - 44, "q3": 91 + 3}
+
+    def test_missing_ranks_make_up_q1(self):
+        deck = [_card(s, r) for s in ("hearts", "spades", "clubs") for r in (1, 2, 3, 4, 5)]
+        assert fiveos.compute_actuals(deck) == {
+            "q1": sum(range(6, 14)), "q2": 3 * (1 - 2 + 3 - 4 + 5), "q3": 3 * 15}
+
+
+class TestOptimalEstimates:
+    def test_with_nothing_known_every_round_is_the_prior(self):
+        optimal = fiveos._compute_optimal_estimates({}, "a")
+        assert set(optimal) == {"1", "2", "3", "4", "5"}
+        assert optimal["1"]["q3"] == 105.0      # 15 cards × average rank 7
+        assert all(v == optimal["1"] for v in optimal.values())
+
+    def test_cards_accumulate_across_rounds(self):
+        game = {
+            "player_cards": {"1": {"a": _card("hearts", 13)}, "2": {"a": _card("clubs", 2)}},
+            "common_cards": {"1": _card("spades", 1), "3": _card("diamonds", 9)},
+        }
+        optimal = fiveos._compute_optimal_estimates(game, "a")
+        expected = [
+            [_card("hearts", 13), _card("spades", 1)],
+            [_card("hearts", 13), _card("spades", 1), _card("clubs", 2)],
+            [_card("hearts", 13), _card("spades", 1), _card("clubs", 2), _card("diamonds", 9)],
+        ]
+        for rnd, known in zip(("1", "2", "3"), expected):
+            q1, q3 = _brute_force_estimate(known)
+            assert (optimal[rnd]["q1"], optimal[rnd]["q3"]) == (q1, q3)
+
+    def test_a_card_seen_twice_counts_once(self):
+        twice = {"player_cards": {"1": {"a": _card("hearts", 13)}, "2": {"a": _card("hearts", 13)}}}
+        once = {"player_cards": {"1": {"a": _card("hearts", 13)}}}
+        assert fiveos._compute_optimal_estimates(twice, "a")["2"] == \
+            fiveos._compute_optimal_estimates(once, "a")["2"]
+
+    def test_other_players_cards_are_not_known(self):
+        game = {"player_cards": {"1": {"b": _card("hearts", 13)}}}
+        assert fiveos._compute_optimal_estimates(game, "a") == fiveos._compute_optimal_estimates({}, "a")
+
+    @pytest.mark.parametrize("rank", [1, 7, 13])
+    def test_a_seen_rank_drops_out_of_q1(self, rank):
+        game = {"common_cards": {"1": _card("hearts", rank)}}
+        q1, _ = _brute_force_estimate([_card("hearts", rank)])
+        assert fiveos._compute_optimal_estimates(game, "a")["1"]["q1"] == q1
+
+
+# ── Polling ─────────────────────────────────────────────────────────────
+
+
+class _Snap:
+    def __init__(self, ref, data):
+        self.id = ref.id
+        self.reference = ref
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Ref:
+    def __init__(self, db, coll, doc_id):
+        self._db, self._coll, self.id = db, coll, doc_id
+
+    async def get(self, transaction=None):
+        self._db.reads[self._coll] += 1
+        return _Snap(self, self._db.store[self._coll].get(self.id))
+
+    async def create(self, data):
+        rows = self._db.store[self._coll]
+        if self.id in rows:
+            raise AlreadyExists(f"{self.id} exists")
+        rows[self.id] = data
+
+    async def update(self, fields):
+        self._db.apply(self, fields)
+
+
+class _Query:
+    def __init__(self, db, coll, filters=()):
+        self._db, self._coll, self._filters = db, coll, filters
+
+    def where(self, field, op, value):
+        assert op == "=="
+        return _Query(self._db, self._coll, self._filters + ((field, value),))
+
+    def limit(self, n):
+        return self
+
+    def document(self, doc_id):
+        return _Ref(self._db, self._coll, doc_id)
+
+    async def get(self):
+        self._db.reads[self._coll] += 1
+        snaps = [_Snap(_Ref(self._db, self._coll, k), v) for k, v in self._db.store[self._coll].items()
+                 if all(v.get(f) == val for f, val in self._filters)]
+        self._db.docs_read[self._coll] += len(snaps)
+        return snaps
+
+
+class _Txn:
+    """Just enough of AsyncTransaction for @async_transactional: writes apply on commit."""
+
+    _read_only = False
+    _max_attempts = 1
+    _id = b"txn"
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def _clean_up(self):
+        self._writes = []
+
+    async def _begin(self, retry_id=None):
+        pass
+
+    async def _commit(self):
+        for ref, fields in self._writes:
+            self._db.apply(ref, fields)
+        self._db.commits += 1
+
+    async def _rollback(self):
+        self._writes = []
+
+    def update(self, ref, fields):
+        self._writes.append((ref, fields))
+
+
+class _FakeDB:
+    def __init__(self, store):
+        self.store = store
+        self.reads = Counter()      # get() calls
+        self.docs_read = Counter()  # documents returned by queries
+        self.commits = 0
+        self.writes = []
+
+    def collection(self, name):
+        return _Query(self, name)
+
+    def transaction(self):
+        return _Txn(self)
+
+    def apply(self, ref, fields):
+        self.writes.append(fields)
+        row = self.store[ref._coll][ref.id]
+        for path, value in fields.items():
+            *parents, key = path.split(".")
+            for part in parents:
+                row = row.setdefault(part, {})
+            if isinstance(value, firestore.ArrayUnion):
+                row[key] = row.get(key, []) + [v for v in value.values if v not in row.get(key, [])]
+            else:
+                row[key] = value
+
+
+def _sub(user_id, rnd, est):
+    return {"game_id": "g1", "user_id": user_id, "round": rnd,
+            "est_q1": est, "est_q2": est, "est_q3": est}
+
+
+@pytest.fixture
+def game_db(monkeypatch):
+    deck = [_card("hearts", r) for r in range(1, 14)] + [_card("spades", 1), _card("spades", 2)]
+    db = _FakeDB({
+        "fiveos_games": {"g1": {
+            "status": "finished", "join_code": "ABC123", "created_by": "a",
+            "players": [{"user_id": "a", "username": "alice", "team": "red"},
+                        {"user_id": "b", "username": "bob", "team": "blue"}],
+            "deck_15": deck,
+            "round_medians": {"1": {"q1": 10, "q2": 10, "q3": 10}},
+        }},
+        "fiveos_submissions": {
+            "s1": _sub("a", 1, 20), "s2": _sub("b", 1, 0), "s3": _sub("b", 2, 5),
+            "other": {**_sub("a", 1, 99), "game_id": "g2"},
+        },
+    })
+    monkeypatch.setattr(fiveos.db_module, "db", db, raising=False)
+    return db
+
+
+def _poll(uid, is_admin=False):
+    user = User(id=uid, username=uid, is_admin=is_admin)
+    return asyncio.run(fiveos.game_state("g1", user=user))
+
+
+class TestGameState:
+    def test_a_player_sees_only_their_own_submissions(self, game_db):
+        state = _poll("b")
+        assert set(state["my_submissions"]) == {"1", "2"}
+        assert state["my_submissions"]["2"]["est_q1"] == 5
+
+    def test_a_mid_round_poll_reads_only_the_callers_rows(self, game_db):
+        game_db.store["fiveos_games"]["g1"]["status"] = "round_2"
+        _poll("b")
+        assert game_db.reads == {"fiveos_games": 1, "fiveos_submissions": 1}
+        assert game_db.docs_read["fiveos_submissions"] == 2
+
+    def test_a_finished_game_also_reads_everyones_for_the_pnl(self, game_db):
+        state = _poll("a")
+        assert game_db.reads == {"fiveos_games": 1, "fiveos_submissions": 2}
+        assert game_db.docs_read["fiveos_submissions"] == 1 + 3
+        # Actuals 0 / 6 / 94 against median 10: alice long every quantity, bob short.
+        assert state["pnl"]["players"]["a"]["pnl"] == pytest.approx(-10 - 4 + 84 - 10)
+        assert state["pnl"]["players"]["b"]["pnl"] == pytest.approx(10 + 4 - 84 - 10)
+        assert state["pnl"]["winner"] == "red"
+
+    def test_outsiders_are_turned_away(self, game_db):
+        with pytest.raises(HTTPException) as exc:
+            _poll("c")
+        assert exc.value.status_code == 403
+
+    def test_a_tie_with_the_median_settles_the_same_way_every_poll(self, game_db):
+        game_db.store["fiveos_submissions"]["s2"] = _sub("b", 1, 10)
+        pnls = {_poll("b")["pnl"]["players"]["b"]["pnl"] for _ in range(20)}
+        assert len(pnls) == 1
+        # Each quantity is ±(actual − median) with no fee; the sides are fixed.
+        possible = {sum(side * v for side, v in zip(sides, (-10, -4, 84)))
+                    for sides in itertools.product((1, -1), repeat=3)}
+        assert pnls.pop() in possible
+
+class TestSubmitAnswers:
+    @pytest.fixture
+    def live_game(self, game_db):
+        game_db.store["fiveos_games"]["g1"]["status"] = "round_2"
+        return game_db
+
+    def _submit(self, uid, est=7.0):
+        req = fiveos.SubmitRequest(est_q1=est, est_q2=est, est_q3=est)
+        return asyncio.run(fiveos.submit_answers("g1", req, user=User(id=uid, username=uid)))
+
+    def test_one_document_per_player_and_round(self, live_game):
+        assert self._submit("a") == {"ok": True}
+        row = live_game.store["fiveos_submissions"]["g1_2_a"]
+        assert (row["round"], row["user_id"], row["est_q2"]) == (2, "a", 7.0)
+
+    def test_a_second_submit_is_rejected_and_keeps_the_first(self, live_game):
+        self._submit("a", est=7.0)
+        with pytest.raises(HTTPException) as exc:
+            self._submit("a", est=9.0)
+        assert exc.value.status_code == 400
+        assert live_game.store["fiveos_submissions"]["g1_2_a"]["est_q1"] == 7.0
+
+
+class TestPlayers:
+    @pytest.fixture
+    def lobby(self, game_db):
+        game_db.store["fiveos_games"]["g1"]["status"] = "lobby"
+        return game_db
+
+    def _join(self, uid):
+        req = fiveos.JoinRequest(join_code=" abc123 ")
+        return asyncio.run(fiveos.join_game(req, user=User(id=uid, username=uid)))
+
+    def _assign(self, by, player_id, team):
+        req = fiveos.AssignTeamRequest(user_id=player_id, team=team)
+        return asyncio.run(fiveos.assign_team("g1", req, user=User(id=by, username=by)))
+
+    def test_joining_appends_only_the_new_player(self, lobby):
+        assert self._join("c") == {"ok": True, "game_id": "g1"}
+        # Sent as a server-side append of the one entry, not the whole list.
+        (write,) = lobby.writes
+        assert isinstance(write["players"], firestore.ArrayUnion)
+        assert write["players"].values == [{"user_id": "c", "username": "c", "team": ""}]
+        assert [p["user_id"] for p in lobby.store["fiveos_games"]["g1"]["players"]] == ["a", "b", "c"]
+
+    def test_joining_twice_writes_nothing(self, lobby):
+        assert self._join("a")["message"] == "Already joined"
+        assert lobby.writes == []
+
+    def test_the_host_sets_a_team_in_a_transaction(self, lobby):
+        self._assign("a", "b", "green")
+        assert lobby.commits == 1
+        players = {p["user_id"]: p["team"] for p in lobby.store["fiveos_games"]["g1"]["players"]}
+        assert players == {"a": "red", "b": "GREEN"}
+
+    @pytest.mark.parametrize("by, player_id, status", [("b", "a", 403), ("a", "zed", 404)])
+    def test_rejected_assignments_commit_nothing(self, lobby, by, player_id, status):
+        with pytest.raises(HTTPException) as exc:
+            self._assign(by, player_id, "green")
+        assert exc.value.status_code == status
+        assert lobby.commits == 0 and lobby.writes == []
+
+
+class TestAdvanceRound:
+    def test_only_the_new_rounds_cards_are_written(self, game_db):
+        game = game_db.store["fiveos_games"]["g1"]
+        game.update(status="round_1", player_cards={"1": {"a": _card("clubs", 4), "b": _card("clubs", 5)}})
+        game["common_cards"] = {"1": game["deck_15"][0]}
+
+        out = asyncio.run(fiveos.advance_round("g1", user=User(id="a", username="alice")))
+
+        assert out == {"ok": True, "status": "round_2"}
+        card_write = game_db.writes[-1]
+        assert set(card_write) == {"status", "player_cards.2"}
+        assert set(game["player_cards"]) == {"1", "2"}
+        assert set(game["player_cards"]["2"]) == {"a", "b"}
+        assert game["common_cards"]["1"] not in game["player_cards"]["2"].values()
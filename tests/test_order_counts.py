@@ -0,0 +1,151 @@
+"""users.orders_count: bumped with each order, zeroed by the admin reset."""
+import asyncio
+from collections import defaultdict
+
+import pytest
+from google.cloud import firestore
+
+from app import admin
+from app import main
+from app.models import User
+from app.order_book import OrderBook
+from app.schemas import OrderIn
+
+
+class _Snap:
+    def __init__(self, ref, data):
+        self.id = ref.id
+        self.reference = ref
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Ref:
+    def __init__(self, db, coll, doc_id):
+        self._db, self._coll, self.id = db, coll, doc_id
+
+    async def update(self, fields):
+        self._db.apply("update", self, fields)
+
+
+class _Coll:
+    def __init__(self, db, name):
+        self._db, self._name = db, name
+
+    def document(self, doc_id):
+        return _Ref(self._db, self._name, doc_id)
+
+    def where(self, field, op, value):
+        assert op == "=="
+        rows = {k: v for k, v in self._db.store[self._name].items() if v.get(field) == value}
+        return _Rows(self._db, self._name, rows)
+
+    def select(self, fields):
+        return _Rows(self._db, self._name, self._db.store[self._name])
+
+
+class _Rows:
+    def __init__(self, db, name, rows):
+        self._db, self._name, self._rows = db, name, rows
+
+    def limit(self, n):
+        return self
+
+    def select(self, fields):
+        return self
+
+    async def get(self):
+        return [_Snap(_Ref(self._db, self._name, k), v) for k, v in self._rows.items()]
+
+    async def stream(self):
+        for snap in await self.get():
+            yield snap
+
+
+class _Batch:
+    def __init__(self, db):
+        self._db = db
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append(("set", ref, data))
+
+    def update(self, ref, fields):
+        self.ops.append(("update", ref, fields))
+
+    def delete(self, ref):
+        self.ops.append(("delete", ref, None))
+
+    async def commit(self):
+        if self.ops:
+            self._db.commits.append([(op, ref._coll, ref.id) for op, ref, _ in self.ops])
+        for op, ref, data in self.ops:
+            self._db.apply(op, ref, data)
+
+
+class _FakeDB:
+    def __init__(self, store):
+        self.store = defaultdict(dict, store)
+        self.commits = []
+
+    def collection(self, name):
+        return _Coll(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+    def apply(self, op, ref, data):
+        rows = self.store[ref._coll]
+        if op == "set":
+            rows[ref.id] = dict(data)
+        elif op == "delete":
+            rows.pop(ref.id, None)
+        else:
+            row = rows[ref.id]
+            for key, value in data.items():
+                if isinstance(value, firestore.Increment):
+                    row[key] = row.get(key, 0) + value.value
+                else:
+                    row[key] = value
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = _FakeDB({
+        "users": {
+            "u1": {"username": "alice", "orders_count": 4, "balance": 9000.0},
+            "admin-1": {"username": "root", "is_admin": True, "orders_count": 2, "balance": 5.0},
+        },
+        "custom_games": {"game_gamex": {"symbol": "GAMEX", "is_active": True, "is_visible": True}},
+    })
+    monkeypatch.setattr(main.db_module, "db", db, raising=False)
+    return db
+
+
+class TestSubmitOrder:
+    def test_the_order_and_the_count_are_written_in_one_batch(self, fake_db, monkeypatch):
+        monkeypatch.setattr(main, "books", defaultdict(OrderBook))
+        order = OrderIn(symbol="gamex", side="BUY", price="10", qty="2")
+
+        ack = asyncio.run(main.submit_order(order, user=User(id="u1", username="alice")))
+
+        first = fake_db.commits[0]
+        assert first == [("set", "orders", ack.order_id), ("update", "users", "u1")]
+        assert fake_db.store["users"]["u1"]["orders_count"] == 5
+        assert fake_db.store["orders"][ack.order_id]["status"] == "OPEN"
+
+
+class TestResetAllUsers:
+    def test_every_order_count_goes_to_zero_but_only_players_get_a_new_balance(self, fake_db, monkeypatch):
+        monkeypatch.setattr(admin, "clear_all_orders", lambda: None)
+        fake_db.store["orders"] = {"o1": {"user_id": "u1"}, "o2": {"user_id": "admin-1"}}
+
+        asyncio.run(admin.reset_all_users(admin=User(id="admin-1", username="root", is_admin=True)))
+
+        users = fake_db.store["users"]
+        assert users["u1"]["orders_count"] == 0 and users["admin-1"]["orders_count"] == 0
+        assert users["u1"]["balance"] == 10000.0
+        assert users["admin-1"]["balance"] == 5.0
+        assert fake_db.store["orders"] == {}